@@ -0,0 +1,61 @@
+"""
+Hot/cold SMS Log storage
+
+SMS Log only keeps recent traffic. archive_old_sms moves settled rows
+older than `archive_after_days` into SMS Log Archive in chunks, keeping
+their names. Readers query SMS Log first and fall through to the archive
+only when a page runs past the hot rows.
+"""
+
+import time
+
+import frappe
+from frappe.utils import add_days, cint, now_datetime
+
+from sms_inbox.utils.settings import get_settings
+
+ARCHIVE_DOCTYPE = "SMS Log Archive"
+ARCHIVE_CHUNK_SIZE = 5000
+ARCHIVE_TIME_BUDGET = 1800
+
+# Queue bookkeeping (pending_enrichment, send_attempts, next_attempt_at) is not carried over
+ARCHIVE_COLUMNS = (
+    "name", "creation", "modified", "owner", "modified_by", "docstatus", "idx",
+    "direction", "status", "read", "sent_at", "twilio_sid", "sent_by", "bulk_job", "sender_number",
+    "phone_number", "phone_key", "contact_name", "linked_doctype", "linked_name", "message", "encoding", "segments", "error_message"
+)
+
+
+def archive_old_sms():
+    """Scheduled (daily_long): move one chunk at a time, committing after each"""
+    days = cint(get_settings().archive_after_days)
+    if days <= 0:
+        return
+
+    cutoff = add_days(now_datetime(), -days)
+    columns = ", ".join(f"`{column}`" for column in ARCHIVE_COLUMNS)
+    started = time.monotonic()
+    while time.monotonic() - started < ARCHIVE_TIME_BUDGET:
+        names = frappe.db.sql("""
+            SELECT name FROM `tabSMS Log`
+            WHERE sent_at < %s AND pending_enrichment = 0 AND status NOT IN ('Pending', 'Sending')
+            ORDER BY sent_at
+            LIMIT %s
+        """, (cutoff, ARCHIVE_CHUNK_SIZE), pluck=True)
+        if not names:
+            break
+        frappe.db.sql(f"INSERT INTO `tabSMS Log Archive` ({columns}) SELECT {columns} FROM `tabSMS Log` WHERE name IN %s", (tuple(names),))
+        frappe.db.sql("DELETE FROM `tabSMS Log` WHERE name IN %s", (tuple(names),))
+        frappe.db.commit()
+
+
+def with_archive(fetch, limit):
+    """Run fetch(doctype, limit) on SMS Log and top the page up from the archive when it comes back short
+
+    Archived rows are older than the hot ones, so they only ever extend a
+    page that is ordered newest first.
+    """
+    rows = fetch("SMS Log", limit)
+    if len(rows) < limit:
+        rows += fetch(ARCHIVE_DOCTYPE, limit - len(rows))
+    return rows
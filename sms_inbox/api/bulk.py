@@ -0,0 +1,170 @@
+"""
+Bulk / broadcast SMS
+
+send_bulk_sms renders a Jinja template for every recipient, bulk-inserts
+the Pending SMS Log rows in one go and hands them to the outbound queue,
+which sends them with its worker pool and per-number rate limit.
+"""
+
+import json
+
+import frappe
+from frappe.utils import cint, now_datetime
+
+from sms_inbox.api.outbound import enqueue_outbound_drain
+from sms_inbox.api.timeline import invalidate_record_sms_counts
+from sms_inbox.sms_inbox.doctype.sms_conversation.sms_conversation import refresh_conversations
+from sms_inbox.sms_inbox.doctype.sms_log.sms_log import reserve_log_names
+from sms_inbox.utils.encoding import analyze_messages, transliterate
+from sms_inbox.utils.phone import get_default_country_code, get_phone_key, normalize_phone_number
+from sms_inbox.utils.senders import assign_senders, save_sender_assignments
+from sms_inbox.utils.settings import get_settings
+
+# Source doctype -> (phone field, display name field)
+BULK_SOURCES = {
+    "Lead": ("mobile_no", "lead_name"),
+    "Contact": ("mobile_no", "full_name"),
+    "Customer": ("mobile_no", "customer_name")
+}
+MAX_BULK_RECIPIENTS = 10000
+INSERT_CHUNK_SIZE = 1000
+
+LOG_FIELDS = (
+    "name", "creation", "modified", "owner", "modified_by", "docstatus", "idx",
+    "direction", "phone_number", "phone_key", "message", "linked_doctype", "linked_name",
+    "status", "contact_name", "sender_number", "encoding", "segments", "sent_by", "sent_at", "read", "bulk_job", "send_attempts"
+)
+
+
+@frappe.whitelist()
+def send_bulk_sms(message_template, recipients=None, doctype=None, filters=None):
+    """Send message_template to a list of recipients or to every record of doctype matching filters
+
+    recipients: list of phone numbers or dicts with phone_number plus any template context
+    """
+    frappe.has_permission("SMS Bulk Job", "create", throw=True)
+    settings = get_settings()
+    if not settings or not settings.enabled:
+        frappe.throw("SMS is not enabled. Configure SMS Settings.")
+
+    recipients = frappe.parse_json(recipients) if isinstance(recipients, str) else recipients
+    filters = frappe.parse_json(filters) if isinstance(filters, str) else filters
+    if recipients:
+        rows = [r if isinstance(r, dict) else {"phone_number": r} for r in recipients]
+    elif doctype:
+        rows = get_source_recipients(doctype, filters)
+    else:
+        frappe.throw("Provide recipients or a doctype")
+    if len(rows) > MAX_BULK_RECIPIENTS:
+        frappe.throw(f"Bulk sends are limited to {MAX_BULK_RECIPIENTS} recipients")
+
+    messages = render_messages(message_template, rows)
+    # Builds before anything is written: reserving the row names commits
+    logs = build_logs(rows, messages)
+
+    job = frappe.get_doc({
+        "doctype": "SMS Bulk Job",
+        "status": "Queued",
+        "source_doctype": doctype if not recipients else None,
+        "source_filters": json.dumps(filters) if filters and not recipients else None,
+        "message_template": message_template
+    }).insert(ignore_permissions=True)
+
+    for log in logs:
+        log.bulk_job = job.name
+    job.db_set({"total_count": len(logs), "skipped_count": len(rows) - len(logs)})
+    if not logs:
+        job.db_set("status", "Completed")
+
+    for i in range(0, len(logs), INSERT_CHUNK_SIZE):
+        frappe.db.bulk_insert("SMS Log", LOG_FIELDS, [[log[f] for f in LOG_FIELDS] for log in logs[i:i + INSERT_CHUNK_SIZE]])
+    refresh_conversations({log["phone_key"] for log in logs})
+    save_sender_assignments({log.phone_key: log.sender_number for log in logs if log.sender_number})
+    invalidate_record_sms_counts((log.linked_doctype, log.linked_name) for log in logs)
+    # Bulk rows are always queued; the drain is registered to start once the rows commit
+    if logs:
+        enqueue_outbound_drain(settings)
+    frappe.db.commit()
+    return {
+        "success": True,
+        "job": job.name,
+        "total": len(logs),
+        "skipped": len(rows) - len(logs),
+        "segments": sum(log.segments for log in logs),
+        "ucs2_count": sum(1 for log in logs if log.encoding == "UCS-2")
+    }
+
+
+@frappe.whitelist()
+def get_bulk_sms_job(name):
+    frappe.has_permission("SMS Bulk Job", "read", name, throw=True)
+    return frappe.db.get_value("SMS Bulk Job", name, ["name", "status", "total_count", "sent_count", "failed_count", "skipped_count"], as_dict=True)
+
+
+def get_source_recipients(doctype, filters=None):
+    if doctype not in BULK_SOURCES:
+        frappe.throw(f"Bulk SMS is not supported for {doctype}")
+    phone_field, name_field = BULK_SOURCES[doctype]
+    rows = frappe.get_list(doctype, filters=filters or {}, fields=["*"], limit_page_length=MAX_BULK_RECIPIENTS + 1)
+    for row in rows:
+        row.phone_number = row.get(phone_field)
+        row.linked_doctype = doctype
+        row.linked_name = row.name
+        row.contact_name = row.get(name_field)
+    return rows
+
+
+def render_messages(message_template, rows):
+    """Compile the template once and render it for every row"""
+    template = frappe.get_jenv().from_string(message_template)
+    messages = [template.render({**row, "doc": row}).strip() for row in rows]
+    if cint(get_settings().transliterate_messages):
+        messages = [transliterate(message) for message in messages]
+    return messages
+
+
+def build_logs(rows, messages, job_name=None):
+    """Pending SMS Log rows ready for bulk_insert, one per distinct number; commits while reserving their names"""
+    default_country_code = get_default_country_code()
+    now = now_datetime()
+    user = frappe.session.user
+    logs, seen = [], set()
+    # One pass over every rendered message; each distinct text is analyzed once
+    for row, message, analysis in zip(rows, messages, analyze_messages(messages)):
+        phone_number = normalize_phone_number(row.get("phone_number"), default_country_code)
+        phone_key = get_phone_key(phone_number, default_country_code)
+        if not phone_key or not message or phone_key in seen:
+            continue
+        seen.add(phone_key)
+        log = frappe._dict({
+            "doctype": "SMS Log",
+            "creation": now,
+            "modified": now,
+            "owner": user,
+            "modified_by": user,
+            "docstatus": 0,
+            "idx": 0,
+            "direction": "Outbound",
+            "phone_number": phone_number,
+            "phone_key": phone_key,
+            "message": message,
+            "encoding": analysis.encoding,
+            "segments": analysis.segments,
+            "linked_doctype": row.get("linked_doctype"),
+            "linked_name": row.get("linked_name"),
+            "status": "Pending",
+            "contact_name": row.get("contact_name"),
+            "sent_by": user,
+            "sent_at": now,
+            "read": 1,
+            "bulk_job": job_name,
+            "send_attempts": 0
+        })
+        logs.append(log)
+
+    for log, name in zip(logs, reserve_log_names(len(logs))):
+        log.name = name
+    senders = assign_senders([log.phone_key for log in logs], get_settings())
+    for log in logs:
+        log.sender_number = senders.get(log.phone_key)
+    return logs
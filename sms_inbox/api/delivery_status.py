@@ -0,0 +1,89 @@
+"""
+Twilio delivery status callbacks
+
+Callbacks are buffered in a redis list and applied by a background job
+as one UPDATE per (status, error) group, keyed on the unique twilio_sid.
+"""
+
+import json
+
+import frappe
+from frappe.utils import get_url, now_datetime
+
+from sms_inbox.api.outbound import publish_status_update
+
+STATUS_BUFFER_KEY = "sms_inbox:status_updates"
+FLUSH_BATCH_SIZE = 500
+MAX_UNMATCHED_ATTEMPTS = 3
+
+TWILIO_STATUS_MAP = {
+    "sent": "Sent",
+    "delivered": "Delivered",
+    "read": "Delivered",
+    "undelivered": "Failed",
+    "failed": "Failed"
+}
+
+# Callbacks can arrive out of order; a status only replaces lower-ranked ones
+STATUS_RANK = {"Pending": 0, "Sending": 1, "Sent": 2, "Delivered": 3, "Failed": 3}
+
+
+def get_status_callback_url():
+    return get_url("/api/method/sms_inbox.api.twilio.receive_status_callback")
+
+
+def buffer_status_update(message_sid, status, error_code=None, attempts=0):
+    frappe.cache().rpush(STATUS_BUFFER_KEY, json.dumps({"sid": message_sid, "status": status, "error_code": error_code, "attempts": attempts}))
+
+
+def enqueue_status_flush():
+    frappe.enqueue("sms_inbox.api.delivery_status.flush_status_updates", queue="short", job_id="sms_inbox_status_flush", deduplicate=True)
+
+
+def flush_status_updates():
+    """Apply buffered callbacks; only what was buffered when the job started is taken so requeued items wait for the next flush"""
+    cache = frappe.cache()
+    key = cache.make_key(STATUS_BUFFER_KEY)
+    remaining = cache.llen(STATUS_BUFFER_KEY)
+    while remaining > 0:
+        pipe = cache.pipeline()
+        pipe.lrange(key, 0, min(remaining, FLUSH_BATCH_SIZE) - 1)
+        pipe.ltrim(key, min(remaining, FLUSH_BATCH_SIZE), -1)
+        items = [json.loads(item) for item in pipe.execute()[0]]
+        if not items:
+            break
+        remaining -= len(items)
+        apply_status_updates(items)
+
+
+def apply_status_updates(items):
+    latest = {}
+    for item in items:
+        current = latest.get(item["sid"])
+        if not current or STATUS_RANK[item["status"]] >= STATUS_RANK[current["status"]]:
+            latest[item["sid"]] = item
+
+    groups = {}
+    for item in latest.values():
+        groups.setdefault((item["status"], item.get("error_code")), []).append(item["sid"])
+
+    now = now_datetime()
+    for (status, error_code), sids in groups.items():
+        lower = tuple(s for s, rank in STATUS_RANK.items() if rank < STATUS_RANK[status])
+        frappe.db.sql("""
+            UPDATE `tabSMS Log` SET status = %(status)s, error_message = %(error)s, modified = %(now)s
+            WHERE twilio_sid IN %(sids)s AND status IN %(lower)s
+        """, {"status": status, "error": f"Twilio error {error_code}" if error_code else None, "now": now, "sids": tuple(sids), "lower": lower})
+
+    rows = frappe.get_all("SMS Log", filters={"twilio_sid": ["in", list(latest)]}, fields=["name", "twilio_sid", "phone_key", "status", "error_message", "sent_by"])
+    frappe.db.commit()
+
+    # The callback can beat send_sms to saving the SID; retry those on a later flush
+    found = {row.twilio_sid for row in rows}
+    for sid, item in latest.items():
+        if sid not in found and item.get("attempts", 0) < MAX_UNMATCHED_ATTEMPTS:
+            buffer_status_update(sid, item["status"], item.get("error_code"), item.get("attempts", 0) + 1)
+
+    for row in rows:
+        if row.status == latest[row.twilio_sid]["status"]:
+            publish_status_update(row)
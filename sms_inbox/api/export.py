@@ -0,0 +1,155 @@
+"""
+Streaming SMS export
+
+export_sms streams SMS Log Archive and then SMS Log rows, joined with
+their conversation, as CSV or JSONL straight off an unbuffered
+server-side cursor, so memory stays flat whatever the row count. With
+background set the same stream is written to a private File by a long
+job and the user gets an sms_export_ready event with its URL.
+"""
+
+import csv
+import io
+import json
+import os
+
+import frappe
+from frappe.utils import add_days, cint, getdate, now_datetime
+from werkzeug.wrappers import Response
+
+from sms_inbox.api.archive import ARCHIVE_DOCTYPE
+from sms_inbox.utils.phone import get_phone_key
+from sms_inbox.utils.realtime import publish_realtime
+
+EXPORT_FORMATS = {"csv": "text/csv; charset=utf-8", "jsonl": "application/x-ndjson; charset=utf-8"}
+EXPORT_COLUMNS = (
+    ("name", "l.name"),
+    ("sent_at", "l.sent_at"),
+    ("direction", "l.direction"),
+    ("status", "l.status"),
+    ("phone_number", "l.phone_key"),
+    ("sender_number", "l.sender_number"),
+    ("contact_name", "l.contact_name"),
+    ("linked_doctype", "l.linked_doctype"),
+    ("linked_name", "l.linked_name"),
+    ("conversation_contact_name", "c.contact_name"),
+    ("conversation_linked_doctype", "c.linked_doctype"),
+    ("conversation_linked_name", "c.linked_name"),
+    ("sent_by", "l.sent_by"),
+    ("message", "l.message"),
+    ("error_message", "l.error_message"),
+    ("twilio_sid", "l.twilio_sid")
+)
+CHUNK_SIZE = 64 * 1024
+
+
+@frappe.whitelist()
+def export_sms(format="csv", phone=None, linked_doctype=None, linked_name=None, from_date=None, to_date=None, background=0):
+    """Stream matching messages, oldest first; from_date and to_date are inclusive dates"""
+    frappe.has_permission("SMS Log", "export", throw=True)
+    if format not in EXPORT_FORMATS:
+        frappe.throw(f"Unsupported export format {format}")
+    filters = {"phone": phone, "linked_doctype": linked_doctype, "linked_name": linked_name, "from_date": from_date, "to_date": to_date}
+    filename = f"sms-export-{now_datetime().strftime('%Y%m%d-%H%M%S')}.{format}"
+
+    if cint(background):
+        frappe.enqueue(
+            "sms_inbox.api.export.write_sms_export",
+            queue="long",
+            timeout=4 * 3600,
+            format=format,
+            filters=filters,
+            filename=filename,
+            user=frappe.session.user
+        )
+        return {"queued": True, "filename": filename}
+
+    response = Response(_stream_with_connection(frappe.local.site, format, filters), mimetype=EXPORT_FORMATS[format])
+    response.headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+    return response
+
+
+def write_sms_export(format, filters, filename, user):
+    """Background job: write the export to a private File and tell the user where it is"""
+    path = frappe.get_site_path("private", "files", filename)
+    with open(path, "w", encoding="utf-8", newline="") as f:
+        for chunk in iter_export(format, filters):
+            f.write(chunk)
+    file = frappe.get_doc({
+        "doctype": "File",
+        "file_name": filename,
+        "file_url": f"/private/files/{filename}",
+        "is_private": 1,
+        "file_size": os.path.getsize(path)
+    })
+    file.flags.ignore_permissions = True
+    file.insert()
+    file.db_set("owner", user)
+    frappe.db.commit()
+    publish_realtime("sms_export_ready", {"file_url": file.file_url, "filename": filename}, user=user)
+
+
+def iter_export(format, filters):
+    """Yield the export in roughly CHUNK_SIZE text chunks"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    fields = [field for field, _ in EXPORT_COLUMNS]
+    if format == "csv":
+        writer.writerow(fields)
+
+    # Archived rows are all older than the hot ones, so the two streams concatenate in order
+    for doctype in (ARCHIVE_DOCTYPE, "SMS Log"):
+        query, values = build_export_query(doctype, filters)
+        with frappe.db.unbuffered_cursor():
+            for row in frappe.db.sql(query, values, as_iterator=True):
+                if format == "csv":
+                    writer.writerow(row)
+                else:
+                    buffer.write(json.dumps(dict(zip(fields, row)), default=str) + "\n")
+                if buffer.tell() >= CHUNK_SIZE:
+                    yield buffer.getvalue()
+                    buffer.seek(0)
+                    buffer.truncate()
+    yield buffer.getvalue()
+
+
+def build_export_query(doctype, filters):
+    conditions, values = [], {}
+    if filters.get("phone"):
+        conditions.append("l.phone_key = %(phone)s")
+        values["phone"] = get_phone_key(filters["phone"])
+    if filters.get("linked_doctype"):
+        conditions.append("l.linked_doctype = %(linked_doctype)s")
+        values["linked_doctype"] = filters["linked_doctype"]
+    if filters.get("linked_name"):
+        conditions.append("l.linked_name = %(linked_name)s")
+        values["linked_name"] = filters["linked_name"]
+    if filters.get("from_date"):
+        conditions.append("l.sent_at >= %(from_date)s")
+        values["from_date"] = getdate(filters["from_date"])
+    if filters.get("to_date"):
+        conditions.append("l.sent_at < %(to_date)s")
+        values["to_date"] = add_days(getdate(filters["to_date"]), 1)
+    columns = ", ".join(column for _, column in EXPORT_COLUMNS)
+    return f"""
+        SELECT {columns}
+        FROM `tab{doctype}` l
+        LEFT JOIN `tabSMS Conversation` c ON c.name = l.phone_key
+        {"WHERE " + " AND ".join(conditions) if conditions else ""}
+        ORDER BY l.sent_at, l.name
+    """, values
+
+
+def _stream_with_connection(site, format, filters):
+    # The WSGI server drains the response after Frappe has finished the
+    # request and closed its connection, so the stream opens its own
+    initialised = getattr(frappe.local, "initialised", False)
+    if not initialised:
+        frappe.init(site=site)
+    frappe.connect()
+    try:
+        yield from iter_export(format, filters)
+    finally:
+        frappe.db.close()
+        if not initialised:
+            frappe.destroy()
@@ -0,0 +1,73 @@
+"""
+Deferred inbound SMS enrichment
+
+receive_sms stores the raw webhook payload with pending_enrichment set and
+acks Twilio straight away. This stage normalizes the number, links the
+record, updates the conversation summary and notifies users, a batch at a
+time. The number the customer texted (Twilio's To) becomes the
+conversation's sender, so replies come from the same number.
+"""
+
+import frappe
+
+BATCH_SIZE = 200
+
+
+def enqueue_inbound_processing():
+    frappe.enqueue(
+        "sms_inbox.api.inbound.process_inbound_messages",
+        queue="short",
+        job_id="sms_inbox_inbound",
+        deduplicate=True,
+        enqueue_after_commit=True
+    )
+
+
+def process_inbound_messages():
+    while process_inbound_batch():
+        pass
+
+
+def process_inbound_batch(batch_size=BATCH_SIZE):
+    from sms_inbox.api.timeline import invalidate_record_sms_counts
+    from sms_inbox.api.twilio import find_linked_record, publish_new_sms_notification
+    from sms_inbox.sms_inbox.doctype.sms_conversation.sms_conversation import update_conversation
+    from sms_inbox.utils.phone import get_default_country_code, get_phone_key, normalize_phone_number
+
+    rows = frappe.db.sql("""
+        SELECT name, phone_number, sender_number, message, direction, sent_at, status, twilio_sid, sent_by
+        FROM `tabSMS Log`
+        WHERE pending_enrichment = 1
+        ORDER BY sent_at, name
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (batch_size,), as_dict=True)
+    if not rows:
+        frappe.db.commit()
+        return 0
+
+    default_country_code = get_default_country_code()
+    links, latest = {}, {}
+    for row in rows:
+        row.phone_number = normalize_phone_number(row.phone_number, default_country_code)
+        row.phone_key = get_phone_key(row.phone_number, default_country_code)
+        if row.phone_number not in links:
+            links[row.phone_number] = find_linked_record(row.phone_number)
+        row.linked_doctype, row.linked_name, row.contact_name = links[row.phone_number]
+
+        frappe.db.set_value("SMS Log", row.name, {
+            "phone_number": row.phone_number,
+            "phone_key": row.phone_key,
+            "linked_doctype": row.linked_doctype,
+            "linked_name": row.linked_name,
+            "contact_name": row.contact_name,
+            "pending_enrichment": 0
+        })
+        update_conversation(row)
+        latest[row.phone_key] = row
+    invalidate_record_sms_counts((doctype, name) for doctype, name, _ in links.values())
+    frappe.db.commit()
+
+    for row in latest.values():
+        publish_new_sms_notification(row)
+    return len(rows)
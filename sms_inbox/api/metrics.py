@@ -0,0 +1,75 @@
+"""
+SMS Inbox metrics endpoints
+
+get_sms_metrics returns the raw series as JSON; get_sms_metrics_prometheus
+serves the same data in the Prometheus text format, e.g. for a scrape job
+authenticated with an API key:
+
+    /api/method/sms_inbox.api.metrics.get_sms_metrics_prometheus
+"""
+
+import math
+import re
+
+import frappe
+from werkzeug.wrappers import Response
+
+from sms_inbox.api.delivery_status import STATUS_BUFFER_KEY
+from sms_inbox.utils.metrics import get_sample_rate, get_series, reset_series
+
+LE_LABEL = re.compile(r',?le="([^"]+)"')
+HISTOGRAM_SUFFIXES = ("_bucket", "_count", "_sum")
+
+
+@frappe.whitelist()
+def get_sms_metrics():
+    frappe.only_for("System Manager")
+    return {"sample_rate": get_sample_rate(), "series": get_series(), "gauges": get_queue_depths()}
+
+
+@frappe.whitelist()
+def get_sms_metrics_prometheus():
+    frappe.only_for("System Manager")
+    return Response(render_prometheus(get_series(), get_queue_depths()), mimetype="text/plain; version=0.0.4; charset=utf-8")
+
+
+@frappe.whitelist(methods=["POST"])
+def reset_sms_metrics():
+    frappe.only_for("System Manager")
+    reset_series()
+    return {"success": True}
+
+
+def get_queue_depths():
+    """Webhook work accepted but not processed yet"""
+    return {
+        "sms_inbox_inbound_pending_enrichment": frappe.db.count("SMS Log", {"pending_enrichment": 1}),
+        "sms_inbox_status_callbacks_buffered": frappe.cache().llen(STATUS_BUFFER_KEY)
+    }
+
+
+def render_prometheus(series, gauges):
+    families = {}
+    for name, value in series.items():
+        base = name.split("{", 1)[0]
+        family, kind = base, "counter"
+        for suffix in HISTOGRAM_SUFFIXES:
+            if base.endswith(suffix):
+                family, kind = base[:-len(suffix)], "histogram"
+        families.setdefault(family, (kind, []))[1].append((name, value))
+    for name, value in gauges.items():
+        families[name] = ("gauge", [(name, value)])
+
+    lines = []
+    for family in sorted(families):
+        kind, samples = families[family]
+        lines.append(f"# TYPE {family} {kind}")
+        lines.extend(f"{name} {value}" for name, value in sorted(samples, key=_sample_order))
+    return "\n".join(lines) + "\n"
+
+
+def _sample_order(sample):
+    # Buckets of one series must be listed in ascending le order
+    name = sample[0]
+    le = LE_LABEL.search(name)
+    return LE_LABEL.sub("", name), math.inf if not le or le.group(1) == "+Inf" else float(le.group(1))
@@ -0,0 +1,139 @@
+"""
+Background outbound SMS queue
+
+send_sms inserts "Pending" SMS Log rows when queued sending is enabled.
+Up to `send_workers` drain jobs claim them with SKIP LOCKED, respect the
+token bucket of the row's sender number and move each row to
+Sending/Sent/Failed.
+"""
+
+import time
+
+import frappe
+from frappe.utils import add_to_date, cint, flt, now_datetime
+
+from sms_inbox.sms_inbox.doctype.sms_bulk_job.sms_bulk_job import record_bulk_result
+from sms_inbox.utils.realtime import publish_realtime
+from sms_inbox.utils.senders import get_sender, sender_params, throttle_sender
+from sms_inbox.utils.settings import get_settings
+from sms_inbox.utils.twilio_client import get_twilio_client
+
+CLAIM_BATCH_SIZE = 20
+DRAIN_TIME_BUDGET = 3000
+STALE_SENDING_MINUTES = 10
+
+
+def enqueue_outbound_drain(settings=None):
+    """Start the drain workers once the current transaction commits; call before frappe.db.commit()"""
+    settings = settings or get_settings()
+    for worker in range(max(cint(settings.send_workers), 1)):
+        frappe.enqueue(
+            "sms_inbox.api.outbound.drain_outbound_queue",
+            queue="long",
+            timeout=DRAIN_TIME_BUDGET + 600,
+            job_id=f"sms_inbox_outbound_{worker}",
+            deduplicate=True,
+            enqueue_after_commit=True
+        )
+
+
+def drain_outbound_queue():
+    settings = get_settings()
+    if not settings.enabled:
+        return
+
+    client = get_twilio_client()
+
+    started = time.monotonic()
+    while time.monotonic() - started < DRAIN_TIME_BUDGET:
+        names = claim_outbound_batch(CLAIM_BATCH_SIZE)
+        if not names:
+            break
+        for name in names:
+            deliver_queued_sms(name, settings, client)
+
+
+def claim_outbound_batch(batch_size):
+    """Move up to batch_size due Pending rows to Sending; rows claimed by other workers are skipped"""
+    now = now_datetime()
+    names = frappe.db.sql("""
+        SELECT name FROM `tabSMS Log`
+        WHERE direction = 'Outbound' AND status = 'Pending' AND (next_attempt_at IS NULL OR next_attempt_at <= %s)
+        ORDER BY sent_at
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+    """, (now, batch_size), pluck=True)
+    if names:
+        frappe.db.sql("""
+            UPDATE `tabSMS Log` SET status = 'Sending', send_attempts = send_attempts + 1, modified = %s
+            WHERE name IN %s
+        """, (now, tuple(names)))
+    frappe.db.commit()
+    for row in _status_rows(names):
+        publish_status_update(row)
+    return names
+
+
+def deliver_queued_sms(name, settings, client):
+    from sms_inbox.api.delivery_status import get_status_callback_url
+
+    log = frappe.db.get_value("SMS Log", name, ["name", "phone_number", "phone_key", "sender_number", "message", "send_attempts", "sent_by", "bulk_job"], as_dict=True)
+    sender = get_sender(log.phone_key, settings, preferred=log.sender_number)
+    throttle_sender(sender, settings)
+    try:
+        msg = client.messages.create(to=log.phone_number, body=log.message, status_callback=get_status_callback_url(), **sender_params(sender, settings))
+    except Exception as e:
+        attempts = cint(log.send_attempts)
+        if attempts < cint(settings.max_send_attempts) and _is_retryable(e):
+            delay = flt(settings.retry_backoff_seconds) * (2 ** (attempts - 1))
+            values = {"status": "Pending", "next_attempt_at": add_to_date(now_datetime(), seconds=delay), "error_message": str(e)}
+        else:
+            values = {"status": "Failed", "error_message": str(e)}
+            frappe.log_error(f"Twilio SMS Error: {str(e)}", "Twilio SMS Failed")
+    else:
+        values = {"status": "Sent", "twilio_sid": msg.sid, "sender_number": sender, "error_message": None}
+
+    frappe.db.set_value("SMS Log", name, values)
+    if log.bulk_job:
+        record_bulk_result(log.bulk_job, values["status"])
+    frappe.db.commit()
+    publish_status_update(frappe._dict(log, **values))
+
+
+def requeue_outbound():
+    """Scheduler safety net: recover rows the queue claimed but never finished and restart drains when work is waiting"""
+    settings = get_settings()
+    if not settings.enabled:
+        return
+    # Runs whatever queue_outbound says: bulk sends and retries are always queued.
+    # send_attempts is only raised by claim_outbound_batch, so synchronous send_sms rows are never resent
+    frappe.db.sql("""
+        UPDATE `tabSMS Log` SET status = 'Pending'
+        WHERE direction = 'Outbound' AND status = 'Sending' AND twilio_sid IS NULL AND send_attempts > 0 AND modified < %s
+    """, (add_to_date(now_datetime(), minutes=-STALE_SENDING_MINUTES),))
+    if frappe.db.exists("SMS Log", {"direction": "Outbound", "status": "Pending"}):
+        enqueue_outbound_drain(settings)
+    frappe.db.commit()
+
+
+def publish_status_update(log):
+    # Bulk sends report progress on their SMS Bulk Job instead
+    if not log.sent_by or log.get("bulk_job"):
+        return
+    publish_realtime(
+        "sms_status_update",
+        {"name": log.name, "phone": log.phone_key, "status": log.status, "error": log.get("error_message")},
+        user=log.sent_by
+    )
+
+
+def _status_rows(names):
+    if not names:
+        return []
+    return frappe.get_all("SMS Log", filters={"name": ["in", names]}, fields=["name", "phone_key", "status", "sent_by", "bulk_job"])
+
+
+def _is_retryable(exc):
+    # TwilioRestException carries the HTTP status; network errors carry none
+    status = cint(getattr(exc, "status", 0))
+    return not status or status == 429 or status >= 500
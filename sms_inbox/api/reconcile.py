@@ -0,0 +1,150 @@
+"""
+Backfill messages the webhooks missed
+
+Every few minutes the account's message list is paged from a high-water
+mark and any message of ours whose SID isn't in SMS Log is bulk-inserted.
+Missed inbound messages go through the normal enrichment stage; outbound
+ones (sent from the Twilio console or another app) are linked and folded
+into their conversations here. The mark is kept with frappe.db.set_global
+so it survives a cache flush, and only advances after a complete pass.
+"""
+
+from datetime import datetime, timedelta, timezone
+
+import frappe
+from frappe.utils import now_datetime
+from frappe.utils.data import convert_utc_to_system_timezone
+
+from sms_inbox.api.archive import ARCHIVE_DOCTYPE
+from sms_inbox.api.delivery_status import TWILIO_STATUS_MAP
+from sms_inbox.api.inbound import enqueue_inbound_processing
+from sms_inbox.api.timeline import invalidate_record_sms_counts
+from sms_inbox.sms_inbox.doctype.sms_conversation.sms_conversation import refresh_conversations
+from sms_inbox.sms_inbox.doctype.sms_log.sms_log import reserve_log_names
+from sms_inbox.utils.encoding import analyze_message
+from sms_inbox.utils.phone import get_default_country_code, get_phone_key, normalize_phone_number
+from sms_inbox.utils.settings import get_settings
+from sms_inbox.utils.twilio_client import get_twilio_client
+
+RECONCILED_UNTIL_KEY = "sms_inbox_reconciled_until"
+RECONCILE_LOCK_KEY = "sms_inbox:reconcile"
+PAGE_SIZE = 500
+INITIAL_LOOKBACK_HOURS = 24
+OVERLAP_MINUTES = 10
+# Leave messages this fresh to their webhook or to send_sms, which may not have saved the SID yet
+SETTLE_SECONDS = 120
+
+RECONCILE_FIELDS = (
+    "name", "creation", "modified", "owner", "modified_by", "docstatus", "idx",
+    "direction", "phone_number", "phone_key", "sender_number", "message", "encoding", "segments", "status", "twilio_sid", "error_message",
+    "linked_doctype", "linked_name", "contact_name", "sent_at", "read", "pending_enrichment", "send_attempts"
+)
+
+
+def reconcile_twilio_messages():
+    """Scheduled: page Twilio's message list from the high-water mark and insert what SMS Log is missing"""
+    settings = get_settings()
+    if not settings.enabled:
+        return
+    cache = frappe.cache()
+    if not cache.set(cache.make_key(RECONCILE_LOCK_KEY), 1, ex=600, nx=True):
+        return
+    try:
+        started = datetime.now(timezone.utc)
+        since = _reconciled_until() or started - timedelta(hours=INITIAL_LOOKBACK_HOURS)
+        settled = started - timedelta(seconds=SETTLE_SECONDS)
+        page = get_twilio_client(settings).messages.page(date_sent_after=since - timedelta(minutes=OVERLAP_MINUTES), page_size=PAGE_SIZE)
+        inserted = 0
+        while page:
+            inserted += backfill_messages([m for m in page if (m.date_sent or m.date_created) <= settled], settings)
+            page = page.next_page()
+        # Messages skipped as unsettled fall inside the next run's overlap
+        frappe.db.set_global(RECONCILED_UNTIL_KEY, settled.isoformat())
+        frappe.db.commit()
+        return inserted
+    finally:
+        cache.delete(cache.make_key(RECONCILE_LOCK_KEY))
+
+
+def backfill_messages(messages, settings):
+    """Insert the messages of ours that SMS Log doesn't have; one lookup and one bulk insert per call"""
+    messages = {m.sid: m for m in messages if _is_ours(m, settings)}
+    if not messages:
+        return 0
+    existing = set(frappe.db.sql(f"""
+        SELECT twilio_sid FROM `tabSMS Log` WHERE twilio_sid IN %(sids)s
+        UNION
+        SELECT twilio_sid FROM `tab{ARCHIVE_DOCTYPE}` WHERE twilio_sid IN %(sids)s
+    """, {"sids": tuple(messages)}, pluck=True))
+    missing = [m for sid, m in messages.items() if sid not in existing]
+    if not missing:
+        return 0
+
+    rows = [_log_row(m, name) for m, name in zip(missing, reserve_log_names(len(missing)))]
+    _link_outbound([row for row in rows if row.direction == "Outbound"])
+    frappe.db.bulk_insert("SMS Log", RECONCILE_FIELDS, [[row[f] for f in RECONCILE_FIELDS] for row in rows], ignore_duplicates=True)
+    refresh_conversations(row.phone_key for row in rows if row.direction == "Outbound")
+    invalidate_record_sms_counts((row.linked_doctype, row.linked_name) for row in rows if row.direction == "Outbound")
+    if any(row.direction == "Inbound" for row in rows):
+        enqueue_inbound_processing()
+    frappe.db.commit()
+    return len(rows)
+
+
+def _is_ours(message, settings):
+    if settings.messaging_service_sid and message.messaging_service_sid == settings.messaging_service_sid:
+        return True
+    numbers = [row.phone_number for row in settings.get("sender_numbers") or []] + [settings.phone_number]
+    ours = message.to if message.direction == "inbound" else message.from_
+    return bool(ours) and get_phone_key(ours) in {get_phone_key(number) for number in numbers if number}
+
+
+def _log_row(message, name):
+    now = now_datetime()
+    inbound = message.direction == "inbound"
+    analysis = analyze_message(message.body)
+    return frappe._dict({
+        "name": name,
+        "creation": now,
+        "modified": now,
+        "owner": "Administrator",
+        "modified_by": "Administrator",
+        "docstatus": 0,
+        "idx": 0,
+        "direction": "Inbound" if inbound else "Outbound",
+        "phone_number": message.from_ if inbound else message.to,
+        "phone_key": None,
+        "sender_number": message.to if inbound else message.from_,
+        "message": message.body or "",
+        "encoding": analysis.encoding,
+        "segments": analysis.segments,
+        "status": "Received" if inbound else TWILIO_STATUS_MAP.get(message.status, "Sent"),
+        "twilio_sid": message.sid,
+        "error_message": f"Twilio error {message.error_code}" if message.error_code else None,
+        "linked_doctype": None,
+        "linked_name": None,
+        "contact_name": None,
+        "sent_at": convert_utc_to_system_timezone(message.date_sent or message.date_created).replace(tzinfo=None),
+        "read": 0 if inbound else 1,
+        # Inbound rows are normalized, linked and announced by sms_inbox.api.inbound
+        "pending_enrichment": 1 if inbound else 0,
+        "send_attempts": 0
+    })
+
+
+def _link_outbound(rows):
+    from sms_inbox.api.twilio import find_linked_record
+
+    default_country_code = get_default_country_code()
+    links = {}
+    for row in rows:
+        row.phone_number = normalize_phone_number(row.phone_number, default_country_code)
+        row.phone_key = get_phone_key(row.phone_number, default_country_code)
+        if row.phone_number not in links:
+            links[row.phone_number] = find_linked_record(row.phone_number)
+        row.linked_doctype, row.linked_name, row.contact_name = links[row.phone_number]
+
+
+def _reconciled_until():
+    value = frappe.db.get_global(RECONCILED_UNTIL_KEY)
+    return datetime.fromisoformat(value) if value else None
@@ -0,0 +1,82 @@
+"""
+Server-side SMS search
+
+Text queries use the FULLTEXT index on SMS Log (message, contact_name,
+phone_key); queries that look like a phone number use the phone_key
+index. Matches come back newest first, grouped by conversation, with
+HTML-escaped snippets that wrap the matched terms in <mark>. SMS Log Archive
+is only searched once the hot matches run out.
+"""
+
+import re
+
+import frappe
+from frappe.utils import escape_html
+
+from sms_inbox.api.archive import with_archive
+from sms_inbox.utils.pagination import keyset_condition, keyset_page, page_limit
+from sms_inbox.utils.phone import get_phone_key
+
+TERM_PATTERN = re.compile(r"\w+", re.UNICODE)
+PHONE_QUERY_PATTERN = re.compile(r"^\+?[\d\s\-()]{6,}$")
+SNIPPET_RADIUS = 40
+
+
+@frappe.whitelist()
+def search_sms(query, limit=50, before_sent_at=None, before_name=None):
+    query = (query or "").strip()
+    terms = [t for t in TERM_PATTERN.findall(query) if len(t) > 1]
+    if not terms:
+        return {"conversations": [], "next_cursor": None}
+    limit = page_limit(limit)
+
+    values = {"before": before_sent_at, "name": before_name}
+    phone_key = get_phone_key(query) if PHONE_QUERY_PATTERN.match(query) else None
+    if phone_key:
+        condition = "phone_key LIKE %(phone)s"
+        values["phone"] = phone_key + "%"
+    else:
+        condition = "MATCH(message, contact_name, phone_key) AGAINST (%(terms)s IN BOOLEAN MODE)"
+        values["terms"] = " ".join(f"+{t}*" for t in terms)
+    if before_sent_at:
+        condition += f" AND {keyset_condition()}"
+
+    def fetch(doctype, fetch_limit):
+        return frappe.db.sql(f"""
+            SELECT name, phone_key, contact_name, direction, message, sent_at
+            FROM `tab{doctype}`
+            WHERE {condition}
+            ORDER BY sent_at DESC, name DESC
+            LIMIT %(limit)s
+        """, dict(values, limit=fetch_limit), as_dict=True)
+
+    rows, next_cursor = keyset_page(with_archive(fetch, limit + 1), limit, "sent_at")
+    return {"conversations": group_matches(rows, terms), "next_cursor": next_cursor}
+
+
+def group_matches(rows, terms):
+    conversations = {}
+    for row in rows:
+        conv = conversations.setdefault(row.phone_key, {"phone_number": row.phone_key, "contact_name": row.contact_name, "matches": []})
+        conv["contact_name"] = conv["contact_name"] or row.contact_name
+        conv["matches"].append({"name": row.name, "direction": row.direction, "sent_at": row.sent_at, "snippet": make_snippet(row.message, terms)})
+    return list(conversations.values())
+
+
+def make_snippet(message, terms):
+    message = message or ""
+    pattern = re.compile("|".join(re.escape(t) for t in sorted(terms, key=len, reverse=True)), re.IGNORECASE)
+    first = pattern.search(message)
+    if first:
+        start, end = max(first.start() - SNIPPET_RADIUS, 0), min(first.end() + SNIPPET_RADIUS, len(message))
+    else:
+        start, end = 0, min(2 * SNIPPET_RADIUS, len(message))
+    window = message[start:end]
+
+    parts, last = [], 0
+    for match in pattern.finditer(window):
+        parts.append(escape_html(window[last:match.start()]))
+        parts.append(f"<mark>{escape_html(match.group())}</mark>")
+        last = match.end()
+    parts.append(escape_html(window[last:]))
+    return ("…" if start > 0 else "") + "".join(parts) + ("…" if end < len(message) else "")
@@ -0,0 +1,70 @@
+"""
+SMS timeline of a linked record
+
+get_record_sms_timeline pages every message linked to a record, hot and
+archived, off the (linked_doctype, linked_name, sent_at) index. The form
+sidebar shows get_record_sms_count, which is cached per record and
+dropped whenever messages are linked to or away from it.
+"""
+
+import frappe
+from frappe.utils import cint
+
+from sms_inbox.api.archive import ARCHIVE_DOCTYPE, with_archive
+from sms_inbox.utils.metrics import instrument
+from sms_inbox.utils.names import set_sender_full_names
+from sms_inbox.utils.pagination import keyset_condition, keyset_page, page_limit
+
+RECORD_COUNT_KEY = "sms_inbox:record_count:{}:{}"
+# Safety net for links written outside the app, e.g. by Data Import or in the SMS Log form
+RECORD_COUNT_TTL = 6 * 60 * 60
+
+
+@frappe.whitelist()
+@instrument
+def get_record_sms_timeline(doctype, name, before_sent_at=None, before_name=None, limit=50):
+    """Messages linked to a record, newest first"""
+    from sms_inbox.api.twilio import MESSAGE_FIELDS
+
+    frappe.has_permission(doctype, "read", name, throw=True)
+    limit = page_limit(limit)
+    condition = f"AND {keyset_condition()}" if before_sent_at else ""
+    values = {"doctype": doctype, "docname": name, "before": before_sent_at, "name": before_name}
+
+    def fetch(table, fetch_limit):
+        return frappe.db.sql(f"""
+            SELECT {", ".join(MESSAGE_FIELDS)}
+            FROM `tab{table}`
+            WHERE linked_doctype = %(doctype)s AND linked_name = %(docname)s {condition}
+            ORDER BY sent_at DESC, name DESC
+            LIMIT %(limit)s
+        """, dict(values, limit=fetch_limit), as_dict=True)
+
+    messages = with_archive(fetch, limit + 1)
+    messages, next_cursor = keyset_page(messages, limit, "sent_at")
+    set_sender_full_names(messages)
+    return {"messages": messages, "next_cursor": next_cursor}
+
+
+@frappe.whitelist()
+@instrument
+def get_record_sms_count(doctype, name):
+    frappe.has_permission(doctype, "read", name, throw=True)
+    cache = frappe.cache()
+    key = RECORD_COUNT_KEY.format(doctype, name)
+    count = cache.get_value(key)
+    if count is None:
+        count = cint(frappe.db.sql(f"""
+            SELECT
+                (SELECT COUNT(*) FROM `tabSMS Log` WHERE linked_doctype = %(doctype)s AND linked_name = %(name)s)
+                + (SELECT COUNT(*) FROM `tab{ARCHIVE_DOCTYPE}` WHERE linked_doctype = %(doctype)s AND linked_name = %(name)s)
+        """, {"doctype": doctype, "name": name})[0][0])
+        cache.set_value(key, count, expires_in_sec=RECORD_COUNT_TTL)
+    return count
+
+
+def invalidate_record_sms_counts(records):
+    """Drop the cached counts of (doctype, name) pairs once the current transaction commits"""
+    keys = list({RECORD_COUNT_KEY.format(doctype, name) for doctype, name in records if doctype and name})
+    if keys:
+        frappe.db.after_commit.add(lambda: frappe.cache().delete_value(keys))
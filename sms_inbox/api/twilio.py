@@ -3,32 +3,52 @@ Twilio SMS Integration API
 """
 
 import frappe
-from frappe.utils import now_datetime
-
-
-def normalize_phone_number(phone_number, default_country_code="+61"):
-    if not phone_number:
-        return ""
-    clean = phone_number.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
-    if clean.startswith("0"):
-        clean = default_country_code + clean[1:]
-    if not clean.startswith("+"):
-        clean = default_country_code + clean
-    return clean
-
-
-def get_default_country_code(fallback="+61"):
-    try:
-        settings = frappe.get_single("SMS Inbox Settings")
-        return (settings.default_country_code or fallback).strip() or fallback
-    except Exception:
-        return fallback
+from frappe.utils import add_to_date, cint, get_datetime, now_datetime
+
+from sms_inbox.api.archive import ARCHIVE_DOCTYPE, with_archive
+from sms_inbox.api.delivery_status import TWILIO_STATUS_MAP, buffer_status_update, enqueue_status_flush, get_status_callback_url
+from sms_inbox.api.inbound import enqueue_inbound_processing
+from sms_inbox.api.outbound import enqueue_outbound_drain
+from sms_inbox.api.timeline import invalidate_record_sms_counts
+from sms_inbox.sms_inbox.doctype.sms_conversation.sms_conversation import (
+    READ_MARKER_JOIN,
+    UNREAD_COUNT_SQL,
+    get_read_total,
+    get_unread_total,
+    mark_read,
+    mark_unread,
+    refresh_conversations,
+    update_conversation
+)
+from sms_inbox.utils.encoding import analyze_message, transliterate
+from sms_inbox.utils.names import set_sender_full_names
+from sms_inbox.utils.pagination import keyset_condition, keyset_page, page_limit
+from sms_inbox.utils.phone import get_default_country_code, get_phone_key, normalize_phone_number
+from sms_inbox.utils.phone_index import lookup_phone, set_sms_link
+from sms_inbox.utils.metrics import instrument
+from sms_inbox.utils.realtime import publish_inbox_event, publish_realtime
+from sms_inbox.utils.senders import get_sender, sender_params
+from sms_inbox.utils.settings import get_settings
+from sms_inbox.utils.twilio_client import get_twilio_client
+
+SEEN_SID_TTL = 24 * 60 * 60
+ATTACH_DOCTYPES = {"Opportunity", "Lead", "Project", "Customer", "Contact"}
+ATTACH_CHUNK_SIZE = 1000
+ATTACH_BACKGROUND_THRESHOLD = 5000
+# Delta syncs re-read this much history before the cursor so rows whose transaction committed late are not missed
+SYNC_OVERLAP_SECONDS = 5
+
+CONVERSATION_FIELDS = ("name", "phone_number", "contact_name", "last_message", "direction", "last_message_time", "linked_doctype", "linked_name", "inbound_count")
+# Conversation columns plus the session user's unread count; queries alias the conversation as c
+CONVERSATION_COLUMNS = ", ".join(f"c.{field}" for field in CONVERSATION_FIELDS) + f", {UNREAD_COUNT_SQL} AS unread_count"
+MESSAGE_FIELDS = ("name", "phone_key", "direction", "message", "sent_at", "status", "contact_name", "linked_doctype", "linked_name", "twilio_sid", "sent_by")
 
 
 @frappe.whitelist()
+@instrument
 def get_sms_settings():
     try:
-        settings = frappe.get_single("SMS Inbox Settings")
+        settings = get_settings()
         if settings and settings.enabled:
             return {"enabled": True, "phone_number": settings.phone_number}
     except Exception:
@@ -37,17 +57,20 @@ def get_sms_settings():
 
 
 @frappe.whitelist()
+@instrument
 def send_sms(recipient_number, message, linked_doctype=None, linked_name=None, contact_name=None):
+    log_name = msg = None
     try:
-        settings = frappe.get_single("SMS Inbox Settings")
+        settings = get_settings()
         if not settings or not settings.enabled:
             frappe.throw("SMS is not enabled. Configure SMS Settings.")
 
         default_country_code = (settings.default_country_code or "+61").strip() or "+61"
         recipient_number = normalize_phone_number(recipient_number, default_country_code)
-
-        from twilio.rest import Client
-        client = Client(settings.account_sid, settings.get_password("auth_token"))
+        queued = cint(settings.queue_outbound)
+        if cint(settings.transliterate_messages):
+            message = transliterate(message)
+        sender = get_sender(get_phone_key(recipient_number, default_country_code), settings)
 
         log = frappe.get_doc({
             "doctype": "SMS Log",
@@ -56,30 +79,59 @@ def send_sms(recipient_number, message, linked_doctype=None, linked_name=None, c
             "message": message,
             "linked_doctype": linked_doctype,
             "linked_name": linked_name,
-            "status": "Sending",
+            "status": "Pending" if queued else "Sending",
             "contact_name": contact_name,
+            "sender_number": sender,
             "sent_by": frappe.session.user,
             "sent_at": now_datetime(),
             "read": 1
         })
         log.insert(ignore_permissions=True)
+        update_conversation(log)
+        set_sms_link(log.phone_key, linked_doctype, linked_name, contact_name)
+        invalidate_record_sms_counts([(linked_doctype, linked_name)])
+        if queued:
+            # Registered before the commit so the after-commit enqueue actually fires
+            enqueue_outbound_drain(settings)
+            frappe.db.commit()
+            return {"success": True, "queued": True, "message": "SMS queued", "log_name": log.name, "recipient_number": recipient_number, "segments": log.segments}
         frappe.db.commit()
+        log_name = log.name
 
-        msg = client.messages.create(to=recipient_number, from_=settings.phone_number, body=message)
+        client = get_twilio_client(settings)
+        msg = client.messages.create(to=recipient_number, body=message, status_callback=get_status_callback_url(), **sender_params(sender, settings))
 
         log.status = "Sent"
         log.twilio_sid = msg.sid
         log.save(ignore_permissions=True)
         frappe.db.commit()
 
-        return {"success": True, "message": "SMS sent!", "sid": msg.sid, "log_name": log.name, "recipient_number": recipient_number}
+        return {"success": True, "message": "SMS sent!", "sid": msg.sid, "log_name": log.name, "recipient_number": recipient_number, "segments": log.segments}
 
     except Exception as e:
+        frappe.db.rollback()
+        # The user is told the send failed, so the row must not be picked up and sent later
+        if log_name and not msg:
+            frappe.db.sql("""
+                UPDATE `tabSMS Log` SET status = 'Failed', error_message = %s, modified = %s
+                WHERE name = %s AND status = 'Sending'
+            """, (str(e), now_datetime(), log_name))
+            frappe.db.commit()
         frappe.log_error(f"Twilio SMS Error: {str(e)}", "Twilio SMS Failed")
         return {"success": False, "error": str(e)}
 
 
+@frappe.whitelist()
+@instrument
+def analyze_sms(message):
+    """Encoding and segment count of message as send_sms would send it"""
+    if cint(get_settings().transliterate_messages):
+        message = transliterate(message)
+    return dict(analyze_message(message), message=message)
+
+
 @frappe.whitelist(allow_guest=True)
+@instrument
 def receive_sms():
     try:
         from_number = frappe.form_dict.get("From", "")
@@ -89,40 +141,81 @@ def receive_sms():
         if not from_number or not message_body:
             return '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
         
-        from_number = normalize_phone_number(from_number, get_default_country_code())
-        linked_doctype, linked_name, contact_name = find_linked_record(from_number)
+        # Twilio retries slow webhooks; drop retries we've already stored
+        if not claim_message_sid(message_sid):
+            frappe.response["type"] = "text/xml"
+            return '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
         
-        log = frappe.get_doc({
+        # Persist the raw message only; linking, the conversation summary and
+        # notifications run in sms_inbox.api.inbound so Twilio gets a fast ack
+        frappe.get_doc({
             "doctype": "SMS Log",
             "direction": "Inbound",
             "phone_number": from_number,
+            "sender_number": frappe.form_dict.get("To"),
             "message": message_body,
-            "linked_doctype": linked_doctype,
-            "linked_name": linked_name,
             "status": "Received",
             "twilio_sid": message_sid,
-            "contact_name": contact_name,
             "sent_at": now_datetime(),
-            "read": 0
-        })
-        log.insert(ignore_permissions=True)
+            "read": 0,
+            "pending_enrichment": 1
+        }).insert(ignore_permissions=True)
+        enqueue_inbound_processing()
         frappe.db.commit()
         
-        publish_new_sms_notification(from_number, message_body, contact_name)
+        frappe.response["type"] = "text/xml"
+        return '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
         
+    except (frappe.UniqueValidationError, frappe.DuplicateEntryError):
+        frappe.db.rollback()
         frappe.response["type"] = "text/xml"
         return '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
         
     except Exception:
+        release_message_sid(frappe.form_dict.get("MessageSid", ""))
         frappe.log_error(frappe.get_traceback(), "Twilio Webhook Error")
         return '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
 
 
+@frappe.whitelist(allow_guest=True)
+@instrument
+def receive_status_callback():
+    """Webhook for Twilio delivery status; buffered and applied in batches"""
+    message_sid = frappe.form_dict.get("MessageSid", "")
+    status = TWILIO_STATUS_MAP.get(frappe.form_dict.get("MessageStatus", ""))
+    if message_sid and status:
+        try:
+            buffer_status_update(message_sid, status, frappe.form_dict.get("ErrorCode"))
+            enqueue_status_flush()
+        except Exception:
+            frappe.log_error(frappe.get_traceback(), "Twilio Status Callback Error")
+    frappe.response["type"] = "text/xml"
+    return '<?xml version="1.0" encoding="UTF-8"?><Response></Response>'
+
+
+def claim_message_sid(message_sid):
+    """True the first time a MessageSid is seen within SEEN_SID_TTL"""
+    if not message_sid:
+        return True
+    cache = frappe.cache()
+    return bool(cache.set(cache.make_key(f"sms_inbox:seen_sid:{message_sid}"), 1, ex=SEEN_SID_TTL, nx=True))
+
+
+def release_message_sid(message_sid):
+    if message_sid:
+        frappe.cache().delete_value(f"sms_inbox:seen_sid:{message_sid}")
+
+
 def find_linked_record(phone_number):
+    linked = lookup_phone(get_phone_key(phone_number))
+    if linked is not None:
+        return linked
+    
+    # Index unavailable (being rebuilt elsewhere); fall back to the database
     normalized = normalize_phone_number(phone_number, get_default_country_code())
     phone_variants = [phone_number, normalized, phone_number.replace("+", "").replace(" ", "").replace("-", "")]
     
-    recent_log = frappe.db.get_value("SMS Log", filters={"phone_number": ["in", phone_variants], "linked_doctype": ["is", "set"], "direction": "Outbound"}, fieldname=["linked_doctype", "linked_name", "contact_name"], order_by="sent_at desc")
+    recent_log = frappe.db.get_value("SMS Log", filters={"phone_key": get_phone_key(phone_number), "linked_doctype": ["is", "set"], "direction": "Outbound"}, fieldname=["linked_doctype", "linked_name", "contact_name"], order_by="sent_at desc")
     if recent_log:
         return recent_log
     
@@ -133,81 +226,260 @@ def find_linked_record(phone_number):
     return None, None, None
 
 
-def publish_new_sms_notification(from_number, message_body, contact_name):
-    preview = message_body[:50] + "..." if len(message_body) > 50 else message_body
-    new_count = get_unread_sms_count()
-    
-    users = frappe.get_all("Has Role", filters={"role": ["in", ["System Manager", "Sales User"]], "parenttype": "User"}, fields=["parent"], distinct=True)
-    for u in users:
-        if u.parent != "Guest":
-            frappe.publish_realtime(event='new_sms', message={"sender": contact_name or from_number, "preview": preview, "phone": from_number, "new_count": new_count}, user=u.parent)
+def publish_new_sms_notification(log):
+    """Notify inbox users; the payload carries the message and conversation rows so clients can patch in place
+
+    The conversation row has inbound_count rather than unread_count, which
+    is per user: clients add the inbound_count change to their own count.
+    """
+    body = log.message or ""
+    preview = body[:50] + "..." if len(body) > 50 else body
+    publish_inbox_event("new_sms", {
+        "sender": log.contact_name or log.phone_key,
+        "preview": preview,
+        "phone": log.phone_key,
+        "message": {field: log.get(field) for field in MESSAGE_FIELDS},
+        "conversation": frappe.db.get_value("SMS Conversation", log.phone_key, CONVERSATION_FIELDS, as_dict=True)
+    })
 
 
 @frappe.whitelist()
+@instrument
 def get_conversations():
-    return frappe.db.sql("""
-        SELECT phone_number, contact_name, message as last_message, direction, sent_at as last_message_time, linked_doctype, linked_name,
-            (SELECT COUNT(*) FROM `tabSMS Log` s2 WHERE s2.phone_number = s1.phone_number AND s2.direction = 'Inbound' AND s2.read = 0) as unread_count
-        FROM `tabSMS Log` s1
-        WHERE sent_at = (SELECT MAX(sent_at) FROM `tabSMS Log` s2 WHERE s2.phone_number = s1.phone_number)
-        ORDER BY sent_at DESC
-    """, as_dict=True)
+    return frappe.db.sql(f"""
+        SELECT {CONVERSATION_COLUMNS}
+        FROM `tabSMS Conversation` c {READ_MARKER_JOIN}
+        ORDER BY c.last_message_time DESC
+    """, {"user": frappe.session.user}, as_dict=True)
 
 
 @frappe.whitelist()
+@instrument
 def get_conversation_messages(phone_number):
-    messages = frappe.get_all("SMS Log", filters={"phone_number": phone_number}, fields=["name", "direction", "message", "sent_at", "status", "contact_name", "linked_doctype", "linked_name", "twilio_sid", "sent_by"], order_by="sent_at asc")
-    for m in messages:
-        m.sender_full_name = frappe.db.get_value("User", m.sent_by, "full_name") if m.direction == "Outbound" and m.sent_by else None
-    return messages
+    phone_key = get_phone_key(phone_number)
+    fields = ["name", "direction", "message", "sent_at", "status", "contact_name", "linked_doctype", "linked_name", "twilio_sid", "sent_by"]
+    messages = frappe.get_all(ARCHIVE_DOCTYPE, filters={"phone_key": phone_key}, fields=fields, order_by="sent_at asc")
+    messages += frappe.get_all("SMS Log", filters={"phone_key": phone_key}, fields=fields, order_by="sent_at asc")
+    return set_sender_full_names(messages)
+
+
+@frappe.whitelist()
+@instrument
+def get_conversations_page(before_sent_at=None, before_name=None, limit=50):
+    limit = page_limit(limit)
+    sync_cursor = now_datetime()
+    condition = f"WHERE {keyset_condition('c.last_message_time', 'c.name')}" if before_sent_at else ""
+    rows = frappe.db.sql(f"""
+        SELECT {CONVERSATION_COLUMNS}
+        FROM `tabSMS Conversation` c {READ_MARKER_JOIN} {condition}
+        ORDER BY c.last_message_time DESC, c.name DESC
+        LIMIT %(limit)s
+    """, {"user": frappe.session.user, "before": before_sent_at, "name": before_name, "limit": limit + 1}, as_dict=True)
+    rows, next_cursor = keyset_page(rows, limit, "last_message_time")
+    return {"conversations": rows, "next_cursor": next_cursor, "sync_cursor": str(sync_cursor)}
+
+
+@frappe.whitelist()
+@instrument
+def get_conversation_messages_page(phone_number, before_sent_at=None, before_name=None, limit=50):
+    """Newest `limit` messages before the cursor, returned oldest first"""
+    limit = page_limit(limit)
+    condition = f"AND {keyset_condition()}" if before_sent_at else ""
+    values = {"phone": get_phone_key(phone_number), "before": before_sent_at, "name": before_name}
+
+    def fetch(doctype, fetch_limit):
+        return frappe.db.sql(f"""
+            SELECT {", ".join(MESSAGE_FIELDS)}
+            FROM `tab{doctype}`
+            WHERE phone_key = %(phone)s {condition}
+            ORDER BY sent_at DESC, name DESC
+            LIMIT %(limit)s
+        """, dict(values, limit=fetch_limit), as_dict=True)
+
+    messages = with_archive(fetch, limit + 1)
+    messages, next_cursor = keyset_page(messages, limit, "sent_at")
+    messages.reverse()
+    set_sender_full_names(messages)
+    return {"messages": messages, "next_cursor": next_cursor}
+
+
+@frappe.whitelist()
+@instrument
+def get_changes_since(cursor, phone_number=None, limit=200):
+    """Conversations, and messages of the phone_number thread, created or modified after cursor
+
+    Pass the returned sync_cursor to the next call. Rows are upserted by
+    name on the client, so the overlap window re-sending a few rows is
+    harmless. has_more means the limit was hit and a full reload is due.
+    """
+    limit = page_limit(limit, default=200, maximum=500)
+    sync_cursor = now_datetime()
+    values = {"since": add_to_date(get_datetime(cursor), seconds=-SYNC_OVERLAP_SECONDS), "user": frappe.session.user, "limit": limit + 1}
+
+    # A conversation changes for this user when its summary or their read marker does
+    conversations = frappe.db.sql(f"""
+        SELECT {CONVERSATION_COLUMNS}
+        FROM `tabSMS Conversation` c {READ_MARKER_JOIN}
+        WHERE c.name IN (
+            SELECT name FROM `tabSMS Conversation` WHERE modified > %(since)s
+            UNION
+            SELECT conversation FROM `tabSMS Read Marker` WHERE user = %(user)s AND modified > %(since)s
+        )
+        ORDER BY c.modified, c.name
+        LIMIT %(limit)s
+    """, values, as_dict=True)
+
+    messages = []
+    if phone_number:
+        messages = frappe.db.sql(f"""
+            SELECT {", ".join(MESSAGE_FIELDS)}
+            FROM `tabSMS Log`
+            WHERE phone_key = %(phone)s AND modified > %(since)s
+            ORDER BY sent_at, name
+            LIMIT %(limit)s
+        """, dict(values, phone=get_phone_key(phone_number)), as_dict=True)
+        set_sender_full_names(messages)
+
+    return {
+        "conversations": conversations[:limit],
+        "messages": messages[:limit],
+        "has_more": len(conversations) > limit or len(messages) > limit,
+        "sync_cursor": str(sync_cursor)
+    }
 
 
 @frappe.whitelist()
+@instrument
 def mark_conversation_read(phone_number):
-    frappe.db.sql("UPDATE `tabSMS Log` SET `read` = 1 WHERE phone_number = %s AND direction = 'Inbound' AND `read` = 0", (phone_number,))
+    phone_key = get_phone_key(phone_number)
+    mark_read(phone_key)
     frappe.db.commit()
+    publish_unread_count(phone_key)
     return {"success": True}
 
 
 @frappe.whitelist()
+@instrument
 def mark_conversation_unread(phone_number):
-    frappe.db.sql("UPDATE `tabSMS Log` SET `read` = 0 WHERE phone_number = %s AND direction = 'Inbound' ORDER BY sent_at DESC LIMIT 1", (phone_number,))
+    phone_key = get_phone_key(phone_number)
+    mark_unread(phone_key)
     frappe.db.commit()
+    publish_unread_count(phone_key)
     return {"success": True}
 
 
+def publish_unread_count(phone_key):
+    # Read state is per user, so only the user's own sessions need the new totals
+    publish_realtime(
+        "sms_unread_count_update",
+        {"phone": phone_key, "new_count": get_unread_total(), "read_total": get_read_total()},
+        user=frappe.session.user
+    )
+
+
 @frappe.whitelist()
+@instrument
 def get_unread_sms_count():
     try:
-        return frappe.db.count("SMS Log", filters={"direction": "Inbound", "read": 0}) or 0
+        return get_unread_total()
     except Exception:
         return 0
 
 
 @frappe.whitelist()
+@instrument
 def attach_conversation_to_record(phone_number, target_doctype, target_name):
-    allowed = {"Opportunity", "Lead", "Project", "Customer", "Contact"}
-    if target_doctype not in allowed:
+    if target_doctype not in ATTACH_DOCTYPES:
         frappe.throw(f"Invalid doctype: {target_doctype}")
     
-    logs = frappe.get_all("SMS Log", filters={"phone_number": phone_number}, pluck="name")
-    for name in logs:
-        frappe.db.set_value("SMS Log", name, {"linked_doctype": target_doctype, "linked_name": target_name})
-    frappe.db.commit()
-    return {"success": True, "message": f"Attached {len(logs)} messages"}
+    phone_key = get_phone_key(phone_number)
+    total = frappe.db.count("SMS Log", {"phone_key": phone_key}) + frappe.db.count(ARCHIVE_DOCTYPE, {"phone_key": phone_key})
+    if total > ATTACH_BACKGROUND_THRESHOLD:
+        frappe.enqueue("sms_inbox.api.twilio.attach_phone_messages", queue="long", phone_key=phone_key, target_doctype=target_doctype, target_name=target_name, progress_user=frappe.session.user)
+        return {"success": True, "queued": True, "message": f"Attaching {total} messages in the background"}
+    
+    total = attach_phone_messages(phone_key, target_doctype, target_name)
+    return {"success": True, "message": f"Attached {total} messages"}
 
 
 @frappe.whitelist()
+@instrument
 def attach_sms_messages_to_record(message_names, target_doctype, target_name):
-    allowed = {"Opportunity", "Lead", "Project", "Customer", "Contact"}
-    if target_doctype not in allowed:
+    if target_doctype not in ATTACH_DOCTYPES:
         frappe.throw(f"Invalid doctype: {target_doctype}")
     
     if isinstance(message_names, str):
         message_names = frappe.parse_json(message_names)
     
-    for name in message_names:
-        frappe.db.set_value("SMS Log", name, {"linked_doctype": target_doctype, "linked_name": target_name})
-    frappe.db.commit()
+    if len(message_names) > ATTACH_BACKGROUND_THRESHOLD:
+        frappe.enqueue("sms_inbox.api.twilio.attach_messages", queue="long", message_names=message_names, target_doctype=target_doctype, target_name=target_name, progress_user=frappe.session.user)
+        return {"success": True, "queued": True, "message": f"Attaching {len(message_names)} messages in the background"}
+    
+    attach_messages(message_names, target_doctype, target_name)
     return {"success": True, "message": f"Attached {len(message_names)} messages"}
 
+
+def attach_phone_messages(phone_key, target_doctype, target_name, progress_user=None):
+    """Link a whole conversation (hot and archived) with UPDATEs by phone_key, ATTACH_CHUNK_SIZE rows at a time
+
+    Rows already linked to the target drop out of the WHERE clause, so each
+    chunk picks up where the last one stopped. Background runs commit and
+    report progress per chunk.
+    """
+    # One grouped read per table gives the row counts and the records the messages move away from
+    records, counts = {(target_doctype, target_name)}, {}
+    for doctype in ("SMS Log", ARCHIVE_DOCTYPE):
+        links = frappe.db.sql(f"""
+            SELECT linked_doctype, linked_name, COUNT(*) FROM `tab{doctype}`
+            WHERE phone_key = %s
+            GROUP BY linked_doctype, linked_name
+        """, (phone_key,))
+        records.update((linked_doctype, linked_name) for linked_doctype, linked_name, _ in links)
+        counts[doctype] = sum(count for *_, count in links)
+
+    total, done = sum(counts.values()), 0
+    values = {"phone": phone_key, "doctype": target_doctype, "name": target_name, "now": now_datetime(), "user": frappe.session.user, "limit": ATTACH_CHUNK_SIZE}
+    for doctype, count in counts.items():
+        for _ in range(0, count, ATTACH_CHUNK_SIZE):
+            frappe.db.sql(f"""
+                UPDATE `tab{doctype}` SET linked_doctype = %(doctype)s, linked_name = %(name)s, modified = %(now)s, modified_by = %(user)s
+                WHERE phone_key = %(phone)s AND NOT (linked_doctype <=> %(doctype)s AND linked_name <=> %(name)s)
+                LIMIT %(limit)s
+            """, values)
+            done = min(done + ATTACH_CHUNK_SIZE, total)
+            if progress_user:
+                invalidate_record_sms_counts(records)
+                frappe.db.commit()
+                publish_realtime("sms_attach_progress", {"done": done, "total": total, "target_doctype": target_doctype, "target_name": target_name}, user=progress_user)
+
+    refresh_conversations([phone_key])
+    invalidate_record_sms_counts(records)
+    set_sms_link(phone_key, target_doctype, target_name, frappe.db.get_value("SMS Conversation", phone_key, "contact_name"))
+    frappe.db.commit()
+    return total
+
+
+def attach_messages(message_names, target_doctype, target_name, progress_user=None):
+    """Link rows with set-based UPDATEs per chunk (hot and archived); background runs commit and report progress per chunk"""
+    total = len(message_names)
+    phone_keys = set()
+    # The target's sidebar count and those of the records the messages move away from
+    records = {(target_doctype, target_name)}
+    for i in range(0, total, ATTACH_CHUNK_SIZE):
+        chunk = tuple(message_names[i:i + ATTACH_CHUNK_SIZE])
+        for doctype in ("SMS Log", ARCHIVE_DOCTYPE):
+            for row in frappe.get_all(doctype, filters={"name": ["in", chunk]}, fields=["phone_key", "linked_doctype", "linked_name"], distinct=True):
+                phone_keys.add(row.phone_key)
+                records.add((row.linked_doctype, row.linked_name))
+            frappe.db.sql(f"""
+                UPDATE `tab{doctype}` SET linked_doctype = %s, linked_name = %s, modified = %s, modified_by = %s
+                WHERE name IN %s
+            """, (target_doctype, target_name, now_datetime(), frappe.session.user, chunk))
+        if progress_user:
+            invalidate_record_sms_counts(records)
+            frappe.db.commit()
+            publish_realtime("sms_attach_progress", {"done": i + len(chunk), "total": total, "target_doctype": target_doctype, "target_name": target_name}, user=progress_user)
+    
+    refresh_conversations(phone_keys)
+    invalidate_record_sms_counts(records)
+    frappe.db.commit()
@@ -0,0 +1,5 @@
+"""
+Performance benchmarks, run through `bench execute`; see runner.py
+"""
+
+from sms_inbox.benchmarks.runner import compare, run
@@ -0,0 +1,131 @@
+"""
+Synthetic SMS Inbox datasets
+
+Every generated row uses a phone number under BENCH_PHONE_PREFIX (+999 is
+not an assigned country code) so a dataset can be removed again without
+touching real traffic. Conversation sizes follow a Zipf-like skew: with
+skew=0 every conversation is about the same size, larger values pile
+messages onto a few very long threads.
+"""
+
+import random
+from itertools import accumulate
+
+import frappe
+from frappe.utils import add_to_date, now_datetime
+
+from sms_inbox.api.archive import ARCHIVE_DOCTYPE
+from sms_inbox.api.bulk import INSERT_CHUNK_SIZE, LOG_FIELDS
+from sms_inbox.sms_inbox.doctype.sms_conversation.sms_conversation import invalidate_unread_totals, refresh_conversations
+from sms_inbox.utils.encoding import analyze_message
+from sms_inbox.utils.phone_index import rebuild_phone_index
+
+BENCH_PHONE_PREFIX = "+999"
+BENCH_CONTACT_PREFIX = "BENCH-CONTACT-"
+BENCH_LOG_PREFIX = "SMS-BENCH-"
+DELETE_CHUNK_SIZE = 10000
+CONTACT_FIELDS = ("name", "creation", "modified", "owner", "modified_by", "docstatus", "idx", "first_name", "full_name", "mobile_no")
+
+WORDS = (
+    "quote", "site", "visit", "tomorrow", "morning", "invoice", "paid", "thanks", "running", "late", "deck", "timber",
+    "delivery", "window", "measure", "approve", "variation", "crew", "arrive", "call", "please", "confirm", "booking",
+    "weather", "rain", "delay", "materials", "ready", "inspection", "council", "permit", "balance", "deposit", "photo"
+)
+
+
+def bench_phone(index):
+    return f"{BENCH_PHONE_PREFIX}{index:09d}"
+
+
+def generate_dataset(size=10000, conversations=None, skew=1.1, contact_ratio=0.5, days=365, inbound_ratio=0.6, seed=42):
+    """Insert `size` SMS Log rows spread over `conversations` threads (size // 20 by default)"""
+    rng = random.Random(seed)
+    conversations = max(int(conversations or size // 20), 1)
+    now = now_datetime()
+    user = frappe.session.user
+
+    contacts = {}
+    contact_rows = []
+    for i in range(conversations):
+        if rng.random() < contact_ratio:
+            name = f"{BENCH_CONTACT_PREFIX}{i:09d}"
+            full_name = f"Bench Contact {i}"
+            contacts[i] = (name, full_name)
+            contact_rows.append([name, now, now, user, user, 0, 0, full_name, full_name, bench_phone(i)])
+    for start in range(0, len(contact_rows), INSERT_CHUNK_SIZE):
+        frappe.db.bulk_insert("Contact", CONTACT_FIELDS, contact_rows[start:start + INSERT_CHUNK_SIZE])
+
+    cum_weights = list(accumulate(1 / (rank + 1) ** skew for rank in range(conversations)))
+    span = days * 24 * 60 * 60
+    for start in range(0, size, INSERT_CHUNK_SIZE):
+        count = min(INSERT_CHUNK_SIZE, size - start)
+        rows = []
+        for offset, phone_index in enumerate(rng.choices(range(conversations), cum_weights=cum_weights, k=count)):
+            inbound = rng.random() < inbound_ratio
+            linked_name, contact_name = contacts.get(phone_index, (None, None))
+            message = " ".join(rng.choices(WORDS, k=rng.randint(3, 25)))
+            analysis = analyze_message(message)
+            log = {
+                "name": f"{BENCH_LOG_PREFIX}{start + offset:09d}",
+                "creation": now,
+                "modified": now,
+                "owner": user,
+                "modified_by": user,
+                "docstatus": 0,
+                "idx": 0,
+                "direction": "Inbound" if inbound else "Outbound",
+                "phone_number": bench_phone(phone_index),
+                "phone_key": bench_phone(phone_index),
+                "message": message,
+                "linked_doctype": "Contact" if linked_name else None,
+                "linked_name": linked_name,
+                "status": "Received" if inbound else "Delivered",
+                "contact_name": contact_name,
+                "sender_number": None,
+                "encoding": analysis.encoding,
+                "segments": analysis.segments,
+                "sent_by": None if inbound else user,
+                "sent_at": add_to_date(now, seconds=-rng.randint(0, span)),
+                "read": 0 if inbound and rng.random() < 0.1 else 1,
+                "bulk_job": None,
+                "send_attempts": 0 if inbound else 1
+            }
+            rows.append([log[field] for field in LOG_FIELDS])
+        frappe.db.bulk_insert("SMS Log", LOG_FIELDS, rows)
+        frappe.db.commit()
+
+    phones = [bench_phone(i) for i in range(conversations)]
+    for start in range(0, len(phones), INSERT_CHUNK_SIZE):
+        refresh_conversations(phones[start:start + INSERT_CHUNK_SIZE])
+        frappe.db.commit()
+    # New conversations carry baseline read counts, which read totals include
+    invalidate_unread_totals()
+    frappe.db.commit()
+    rebuild_phone_index()
+
+    sizes = frappe.db.sql("""
+        SELECT phone_key, COUNT(*) FROM `tabSMS Log` WHERE phone_key LIKE %s GROUP BY phone_key ORDER BY COUNT(*) DESC
+    """, (BENCH_PHONE_PREFIX + "%",))
+    return frappe._dict({
+        "size": size,
+        "conversations": len(sizes),
+        "contacts": len(contact_rows),
+        "skew": skew,
+        "largest_conversation": {"phone": sizes[0][0], "messages": sizes[0][1]} if sizes else None,
+        "median_conversation": {"phone": sizes[len(sizes) // 2][0], "messages": sizes[len(sizes) // 2][1]} if sizes else None
+    })
+
+
+def clear_dataset():
+    """Delete everything generate_dataset (and the benchmarks themselves) wrote"""
+    pattern = BENCH_PHONE_PREFIX + "%"
+    for doctype in ("SMS Log", ARCHIVE_DOCTYPE):
+        while names := frappe.db.sql(f"SELECT name FROM `tab{doctype}` WHERE phone_key LIKE %s LIMIT %s", (pattern, DELETE_CHUNK_SIZE), pluck=True):
+            frappe.db.sql(f"DELETE FROM `tab{doctype}` WHERE name IN %s", (tuple(names),))
+            frappe.db.commit()
+    frappe.db.sql("DELETE FROM `tabSMS Read Marker` WHERE conversation LIKE %s", (pattern,))
+    frappe.db.sql("DELETE FROM `tabSMS Conversation` WHERE name LIKE %s", (pattern,))
+    frappe.db.sql("DELETE FROM `tabContact` WHERE name LIKE %s", (BENCH_CONTACT_PREFIX + "%",))
+    invalidate_unread_totals()
+    frappe.db.commit()
+    rebuild_phone_index()
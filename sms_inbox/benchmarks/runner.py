@@ -0,0 +1,236 @@
+"""
+Benchmark runner
+
+    bench --site <site> execute sms_inbox.benchmarks.run --kwargs "{'size': 100000, 'output': '/tmp/sms.json'}"
+    bench --site <site> execute sms_inbox.benchmarks.compare --args "['/tmp/base.json', '/tmp/sms.json']"
+
+Run on a throwaway site with `allow_tests` set in its site config and with
+background workers stopped: the runner writes a synthetic dataset, sends
+through the local Twilio stand-in and temporarily changes SMS Inbox
+Settings. Everything it wrote is removed again unless keep_data is set.
+"""
+
+import json
+import platform
+import random
+import statistics
+import time
+
+import frappe
+from frappe.utils import now_datetime
+
+import sms_inbox
+from sms_inbox.api import outbound, reconcile, twilio
+from sms_inbox.api.bulk import INSERT_CHUNK_SIZE, LOG_FIELDS, build_logs
+from sms_inbox.api.inbound import process_inbound_messages
+from sms_inbox.benchmarks.data import bench_phone, clear_dataset, generate_dataset
+from sms_inbox.benchmarks.twilio_stub import TwilioStub
+from sms_inbox.sms_inbox.doctype.sms_conversation.sms_conversation import invalidate_unread_totals
+from sms_inbox.utils.settings import clear_settings_cache
+
+ATTACH_TARGET = ("Contact", "BENCH-CONTACT-ATTACH")
+BENCH_SETTINGS = {
+    "enabled": 1,
+    "account_sid": "ACbenchmark",
+    "phone_number": "+999000000000",
+    "queue_outbound": 0,
+    "rate_limit_per_second": 0,
+    "max_send_attempts": 1
+}
+
+
+def run(size=10000, conversations=None, skew=1.1, contact_ratio=0.5, repeat=20, webhook_count=500, send_count=200,
+        twilio_latency=0.05, twilio_jitter=0.0, twilio_error_rate=0.0, seed=42, output=None, keep_data=False):
+    if not frappe.conf.allow_tests:
+        frappe.throw("Benchmarks write synthetic data; enable allow_tests in site_config to run them on this site")
+
+    started = now_datetime()
+    rng = random.Random(seed)
+    clear_dataset()
+    generate_started = time.perf_counter()
+    dataset = generate_dataset(size, conversations=conversations, skew=skew, contact_ratio=contact_ratio, seed=seed)
+    dataset.generate_seconds = round(time.perf_counter() - generate_started, 3)
+
+    largest = dataset.largest_conversation["phone"]
+    median = dataset.median_conversation["phone"]
+    sample_phones = [bench_phone(rng.randrange(dataset.conversations)) for _ in range(repeat)]
+    results = {}
+    try:
+        results["get_conversations"] = timed(twilio.get_conversations, repeat)
+        results["get_conversations_page"] = timed(twilio.get_conversations_page, repeat)
+        results["get_conversation_messages.largest"] = timed(lambda: twilio.get_conversation_messages(largest), repeat)
+        results["get_conversation_messages.median"] = timed(lambda: twilio.get_conversation_messages(median), repeat)
+        results["get_conversation_messages_page.largest"] = timed(lambda: twilio.get_conversation_messages_page(largest), repeat)
+        results["find_linked_record"] = timed(lambda: twilio.find_linked_record(rng.choice(sample_phones)), repeat)
+        results["get_unread_sms_count.cached"] = timed(twilio.get_unread_sms_count, repeat)
+        results["get_unread_sms_count.cold"] = timed(lambda: (_drop_unread_totals(), twilio.get_unread_sms_count()), repeat)
+        results["receive_sms"] = receive_sms_throughput(webhook_count, dataset.conversations, rng)
+        results["process_inbound_messages"] = throughput(process_inbound_messages, webhook_count)
+        results["attach_sms_messages_to_record"] = timed(lambda: _attach_sample(median), repeat)
+        results["attach_conversation_to_record.largest"] = timed(
+            lambda: twilio.attach_conversation_to_record(largest, *ATTACH_TARGET), max(repeat // 5, 1)
+        )
+        with bench_settings(), TwilioStub(twilio_latency, twilio_jitter, twilio_error_rate, seed=seed) as stub:
+            frappe.local.conf["sms_inbox_twilio_base_url"] = stub.base_url
+            results["send_sms"] = send_sms_throughput(send_count, dataset.conversations, rng)
+            results["outbound_drain"] = outbound_drain_throughput(send_count, dataset.conversations, rng)
+            results["reconcile_twilio_messages"] = reconcile_throughput(stub, webhook_count, dataset.conversations, rng)
+            results["twilio_stub"] = stub.stats()
+    finally:
+        frappe.local.conf.pop("sms_inbox_twilio_base_url", None)
+        if not keep_data:
+            clear_dataset()
+
+    report = {
+        "app_version": sms_inbox.__version__,
+        "frappe_version": frappe.__version__,
+        "python_version": platform.python_version(),
+        "db_type": frappe.conf.db_type or "mariadb",
+        "site": frappe.local.site,
+        "started_at": str(started),
+        "params": {
+            "size": size, "conversations": conversations, "skew": skew, "contact_ratio": contact_ratio, "repeat": repeat,
+            "webhook_count": webhook_count, "send_count": send_count, "twilio_latency": twilio_latency,
+            "twilio_jitter": twilio_jitter, "twilio_error_rate": twilio_error_rate, "seed": seed
+        },
+        "dataset": dataset,
+        "results": results
+    }
+    if output:
+        with open(output, "w") as f:
+            json.dump(report, f, indent=2, default=str)
+    return report
+
+
+def compare(baseline, current):
+    """Change in median latency (or throughput) per benchmark between two JSON reports"""
+    with open(baseline) as f:
+        before = json.load(f)["results"]
+    with open(current) as f:
+        after = json.load(f)["results"]
+    changes = {}
+    for name in sorted(set(before) & set(after)):
+        if "median_ms" in before[name]:
+            changes[name] = _change(before[name]["median_ms"], after[name]["median_ms"], higher_is_better=False)
+        elif "per_second" in before[name]:
+            changes[name] = _change(before[name]["per_second"], after[name]["per_second"], higher_is_better=True)
+    return changes
+
+
+def timed(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    frappe.db.rollback()
+    return summarize(samples)
+
+
+def throughput(fn, count):
+    start = time.perf_counter()
+    fn()
+    seconds = time.perf_counter() - start
+    return {"count": count, "seconds": round(seconds, 3), "per_second": round(count / seconds, 1) if seconds else None}
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        "runs": len(samples),
+        "min_ms": round(samples[0], 3),
+        "median_ms": round(statistics.median(samples), 3),
+        "p95_ms": round(samples[int(0.95 * (len(samples) - 1))], 3),
+        "max_ms": round(samples[-1], 3),
+        "mean_ms": round(statistics.fmean(samples), 3)
+    }
+
+
+def receive_sms_throughput(count, conversations, rng):
+    """Drive the webhook in-process the way a request would, one commit per message"""
+    def deliver():
+        for i in range(count):
+            frappe.local.form_dict = frappe._dict({
+                "From": bench_phone(rng.randrange(conversations)),
+                "To": BENCH_SETTINGS["phone_number"],
+                "Body": f"Benchmark inbound message {i}",
+                "MessageSid": f"SMbench{rng.getrandbits(64):016x}{i}"
+            })
+            twilio.receive_sms()
+    return throughput(deliver, count)
+
+
+def send_sms_throughput(count, conversations, rng):
+    def send():
+        for i in range(count):
+            twilio.send_sms(bench_phone(rng.randrange(conversations)), f"Benchmark outbound message {i}")
+    return throughput(send, count)
+
+
+def outbound_drain_throughput(count, conversations, rng):
+    """Queue Pending rows directly, then drain them in this process"""
+    rows = [{"phone_number": bench_phone(rng.randrange(conversations))} for _ in range(count)]
+    logs = build_logs(rows, [f"Benchmark queued message {i}" for i in range(count)], None)
+    for start in range(0, len(logs), INSERT_CHUNK_SIZE):
+        frappe.db.bulk_insert("SMS Log", LOG_FIELDS, [[log[f] for f in LOG_FIELDS] for log in logs[start:start + INSERT_CHUNK_SIZE]])
+    frappe.db.commit()
+    return throughput(outbound.drain_outbound_queue, len(logs))
+
+
+def reconcile_throughput(stub, count, conversations, rng):
+    """Plant messages the webhook never delivered and time one reconciliation pass over the whole list"""
+    previous = frappe.db.get_global(reconcile.RECONCILED_UNTIL_KEY)
+    sent_at = time.time() - reconcile.SETTLE_SECONDS - 60
+    for i in range(count):
+        stub.add_inbound_message(bench_phone(rng.randrange(conversations)), BENCH_SETTINGS["phone_number"], f"Benchmark missed message {i}", sent_at)
+    frappe.db.set_global(reconcile.RECONCILED_UNTIL_KEY, None)
+    try:
+        return throughput(reconcile.reconcile_twilio_messages, count)
+    finally:
+        # Enrichment sets phone_key, which clear_dataset deletes by
+        process_inbound_messages()
+        frappe.db.set_global(reconcile.RECONCILED_UNTIL_KEY, previous)
+        frappe.db.commit()
+
+
+class bench_settings:
+    """Point SMS Inbox Settings at the stand-in for the duration of the block"""
+
+    def __enter__(self):
+        from frappe.utils.password import get_decrypted_password, set_encrypted_password
+
+        self.previous = {field: frappe.db.get_single_value("SMS Inbox Settings", field) for field in BENCH_SETTINGS}
+        self.had_token = bool(get_decrypted_password("SMS Inbox Settings", "SMS Inbox Settings", "auth_token", raise_exception=False))
+        for field, value in BENCH_SETTINGS.items():
+            frappe.db.set_single_value("SMS Inbox Settings", field, value)
+        if not self.had_token:
+            set_encrypted_password("SMS Inbox Settings", "SMS Inbox Settings", "benchmark", "auth_token")
+        frappe.db.commit()
+        clear_settings_cache()
+
+    def __exit__(self, *exc):
+        from frappe.utils.password import remove_encrypted_password
+
+        for field, value in self.previous.items():
+            frappe.db.set_single_value("SMS Inbox Settings", field, value)
+        if not self.had_token:
+            remove_encrypted_password("SMS Inbox Settings", "SMS Inbox Settings", "auth_token")
+        frappe.db.commit()
+        clear_settings_cache()
+
+
+def _drop_unread_totals():
+    invalidate_unread_totals()
+    frappe.db.commit()
+
+
+def _attach_sample(phone_key, count=100):
+    names = frappe.get_all("SMS Log", filters={"phone_key": phone_key}, pluck="name", limit=count)
+    twilio.attach_sms_messages_to_record(names, *ATTACH_TARGET)
+
+
+def _change(before, after, higher_is_better):
+    if not before or after is None:
+        return None
+    change = (after - before) / before * 100
+    return {"before": before, "after": after, "change_pct": round(change, 1), "regression": change < 0 if higher_is_better else change > 0}
@@ -0,0 +1,185 @@
+"""
+Local stand-in for the Twilio Messages API
+
+Serves POST (create) and GET (list) on
+/2010-04-01/Accounts/<AccountSid>/Messages.json with configurable latency
+and error rate, so send throughput can be measured offline. The list
+honours DateSent> and pages like Twilio's, and add_inbound_message plants
+messages the webhook never delivered, for exercising reconciliation. The
+app is pointed at it through the `sms_inbox_twilio_base_url` site config
+key.
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime
+from email.utils import formatdate, parsedate_to_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlencode, urlparse
+
+MESSAGES_PATH = re.compile(r"^/2010-04-01/Accounts/(?P<account_sid>\w+)/Messages\.json$")
+LIST_PAGE_SIZE = 50
+
+
+class TwilioStub:
+    """Threaded HTTP server; use as a context manager or call start()/stop()
+
+    latency is the base delay per request in seconds, jitter adds up to that
+    much random delay on top, and error_rate is the share of creates that
+    fail with error_status (429 and 5xx are retried by the outbound queue).
+    """
+
+    def __init__(self, latency=0.05, jitter=0.0, error_rate=0.0, error_status=500, host="127.0.0.1", port=0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.random = random.Random(seed)
+        self.messages = []
+        self.errors = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer((host, port), self._handler_class())
+        self.server.daemon_threads = True
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def stats(self):
+        with self.lock:
+            return {"created": len(self.messages), "errors": self.errors}
+
+    def create_message(self, account_sid, form):
+        with self.lock:
+            delay = self.latency + self.random.uniform(0, self.jitter)
+            failed = self.random.random() < self.error_rate
+            if failed:
+                self.errors += 1
+        time.sleep(delay)
+        if failed:
+            return self.error_status, {
+                "code": 20429 if self.error_status == 429 else 20500,
+                "message": "Simulated failure from the benchmark Twilio stand-in",
+                "more_info": "https://www.twilio.com/docs/errors/20500",
+                "status": self.error_status
+            }
+
+        message = self._message(account_sid, form.get("From"), form.get("To"), form.get("Body"), "outbound-api", "queued")
+        message["messaging_service_sid"] = form.get("MessagingServiceSid")
+        with self.lock:
+            self.messages.append(message)
+        return 201, message
+
+    def add_inbound_message(self, from_number, to_number, body, sent_at=None, account_sid="ACbenchmark"):
+        """Record an inbound message as if Twilio received it (at unix time sent_at) but the webhook never arrived"""
+        message = self._message(account_sid, from_number, to_number, body, "inbound", "received", sent_at)
+        with self.lock:
+            self.messages.append(message)
+        return message
+
+    def _message(self, account_sid, from_number, to_number, body, direction, status, sent_at=None):
+        sid = f"SM{uuid.uuid4().hex}"
+        return {
+            "sid": sid,
+            "account_sid": account_sid,
+            "messaging_service_sid": None,
+            "to": to_number,
+            "from": from_number,
+            "body": body,
+            "status": status,
+            "direction": direction,
+            "num_segments": "1",
+            "num_media": "0",
+            "price": None,
+            "price_unit": "USD",
+            "error_code": None,
+            "error_message": None,
+            "api_version": "2010-04-01",
+            "date_created": formatdate(usegmt=True),
+            "date_updated": formatdate(usegmt=True),
+            "date_sent": formatdate(sent_at, usegmt=True),
+            "uri": f"/2010-04-01/Accounts/{account_sid}/Messages/{sid}.json",
+            "subresource_uris": {}
+        }
+
+    def list_messages(self, path, query):
+        """Newest first, filtered on DateSent> and paged with Page/PageSize"""
+        page_size = int(query.get("PageSize", [LIST_PAGE_SIZE])[0])
+        page = int(query.get("Page", [0])[0])
+        sent_after = query.get("DateSent>", [None])[0]
+        with self.lock:
+            messages = list(reversed(self.messages))
+        if sent_after:
+            sent_after = datetime.fromisoformat(sent_after.replace("Z", "+00:00"))
+            messages = [m for m in messages if parsedate_to_datetime(m["date_sent"]) > sent_after]
+        start = page * page_size
+        has_next = len(messages) > start + page_size
+        messages = messages[start:start + page_size]
+
+        def page_uri(number):
+            params = {k: v[0] for k, v in query.items() if k not in ("Page", "PageToken")}
+            return f"{path}?{urlencode(dict(params, Page=number, PageSize=page_size))}"
+
+        return 200, {
+            "messages": messages,
+            "uri": page_uri(page),
+            "first_page_uri": page_uri(0),
+            "next_page_uri": page_uri(page + 1) if has_next else None,
+            "previous_page_uri": page_uri(page - 1) if page else None,
+            "page": page,
+            "page_size": page_size,
+            "start": start,
+            "end": start + max(len(messages) - 1, 0)
+        }
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                match = MESSAGES_PATH.match(urlparse(self.path).path)
+                if not match:
+                    return self._reply(404, {"code": 20404, "message": "Not found", "status": 404})
+                length = int(self.headers.get("Content-Length") or 0)
+                form = {k: v[0] for k, v in parse_qs(self.rfile.read(length).decode()).items()}
+                self._reply(*stub.create_message(match.group("account_sid"), form))
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if not MESSAGES_PATH.match(url.path):
+                    return self._reply(404, {"code": 20404, "message": "Not found", "status": 404})
+                self._reply(*stub.list_messages(url.path, parse_qs(url.query)))
+
+            def _reply(self, status, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -1,13 +1,14 @@
 import frappe
 
+from sms_inbox.sms_inbox.doctype.sms_conversation.sms_conversation import get_read_total, get_unread_total
+
 
 def boot_session(bootinfo):
     """Add SMS unread count to boot session"""
     if frappe.session.user != "Guest":
         try:
-            bootinfo.unread_sms_count = frappe.db.count("SMS Log", filters={
-                "direction": "Inbound",
-                "read": 0
-            }) or 0
+            bootinfo.unread_sms_count = get_unread_total()
+            bootinfo.sms_read_total = get_read_total()
         except Exception:
             bootinfo.unread_sms_count = 0
+            bootinfo.sms_read_total = 0
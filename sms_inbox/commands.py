@@ -0,0 +1,21 @@
+import click
+from frappe.commands import get_site, pass_context
+
+
+@click.command("rebuild-sms-phone-index")
+@pass_context
+def rebuild_sms_phone_index(context):
+    """Rebuild the phone number index used to link inbound SMS to records"""
+    import frappe
+    from sms_inbox.utils.phone_index import rebuild_phone_index
+
+    frappe.init(site=get_site(context))
+    frappe.connect()
+    try:
+        if not rebuild_phone_index():
+            click.echo("A rebuild is already running")
+    finally:
+        frappe.destroy()
+
+
+commands = [rebuild_sms_phone_index]
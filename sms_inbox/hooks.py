@@ -13,5 +13,46 @@ boot_session = "sms_inbox.boot.boot_session"
 
 # Guest methods (Twilio webhook)
 guest_methods = [
-    "sms_inbox.api.twilio.receive_sms"
+    "sms_inbox.api.twilio.receive_sms",
+    "sms_inbox.api.twilio.receive_status_callback"
 ]
+
+# Document events
+doc_events = {
+    "User": {
+        "on_update": "sms_inbox.utils.names.clear_display_name",
+        "on_trash": "sms_inbox.utils.names.clear_display_name"
+    },
+    "Contact": {
+        "on_update": ["sms_inbox.utils.names.clear_display_name", "sms_inbox.utils.phone_index.update_phone_index"],
+        "on_trash": ["sms_inbox.utils.names.clear_display_name", "sms_inbox.utils.phone_index.update_phone_index"]
+    },
+    "Lead": {
+        "on_update": "sms_inbox.utils.phone_index.update_phone_index",
+        "on_trash": "sms_inbox.utils.phone_index.update_phone_index"
+    },
+    "Customer": {
+        "on_update": "sms_inbox.utils.phone_index.update_phone_index",
+        "on_trash": "sms_inbox.utils.phone_index.update_phone_index"
+    }
+}
+
+# Scheduled tasks
+scheduler_events = {
+    "all": [
+        "sms_inbox.api.outbound.requeue_outbound",
+        "sms_inbox.api.inbound.process_inbound_messages",
+        "sms_inbox.api.delivery_status.flush_status_updates"
+    ],
+    "hourly": [
+        "sms_inbox.sms_inbox.doctype.sms_conversation.sms_conversation.reconcile_unread_counts"
+    ],
+    "daily_long": [
+        "sms_inbox.api.archive.archive_old_sms"
+    ],
+    "cron": {
+        "*/5 * * * *": [
+            "sms_inbox.api.reconcile.reconcile_twilio_messages"
+        ]
+    }
+}
@@ -0,0 +1,27 @@
+import frappe
+
+from sms_inbox.utils.phone import get_default_country_code, get_phone_key
+
+CHUNK_SIZE = 5000
+
+
+def execute():
+    default_country_code = get_default_country_code()
+    last_name = ""
+    while True:
+        rows = frappe.db.sql("""
+            SELECT name, phone_number FROM `tabSMS Log`
+            WHERE name > %s
+            ORDER BY name
+            LIMIT %s
+        """, (last_name, CHUNK_SIZE))
+        if not rows:
+            break
+
+        by_key = {}
+        for name, phone_number in rows:
+            by_key.setdefault(get_phone_key(phone_number, default_country_code), []).append(name)
+        for phone_key, names in by_key.items():
+            frappe.db.sql("UPDATE `tabSMS Log` SET phone_key = %s WHERE name IN %s", (phone_key, tuple(names)))
+        frappe.db.commit()
+        last_name = rows[-1][0]
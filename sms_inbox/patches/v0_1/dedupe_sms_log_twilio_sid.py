@@ -0,0 +1,15 @@
+import frappe
+
+
+def execute():
+    """Clear blank SIDs and drop duplicate webhook rows so twilio_sid can carry a unique index"""
+    frappe.db.sql("UPDATE `tabSMS Log` SET twilio_sid = NULL WHERE twilio_sid = ''")
+    frappe.db.sql("""
+        DELETE l FROM `tabSMS Log` l
+        JOIN (
+            SELECT twilio_sid, MIN(name) AS keep FROM `tabSMS Log`
+            WHERE twilio_sid IS NOT NULL
+            GROUP BY twilio_sid
+            HAVING COUNT(*) > 1
+        ) d ON d.twilio_sid = l.twilio_sid AND l.name != d.keep
+    """)
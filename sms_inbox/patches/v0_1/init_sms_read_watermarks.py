@@ -0,0 +1,16 @@
+import frappe
+
+
+def execute():
+    # Seed the conversation counters; the old global read flags become everyone's starting watermark
+    frappe.db.sql("""
+        UPDATE `tabSMS Conversation` c
+        JOIN (
+            SELECT phone_key, COUNT(*) AS inbound_count, SUM(`read`) AS read_count FROM `tabSMS Log`
+            WHERE direction = 'Inbound'
+            GROUP BY phone_key
+        ) u ON u.phone_key = c.name
+        SET c.inbound_count = u.inbound_count, c.baseline_read_count = u.read_count
+    """)
+    frappe.cache().delete_value("sms_inbox:unread_total")
+    frappe.cache().delete_value("sms_inbox:inbound_total")
@@ -0,0 +1,5 @@
+from sms_inbox.sms_inbox.doctype.sms_conversation.sms_conversation import rebuild_conversations
+
+
+def execute():
+    rebuild_conversations()
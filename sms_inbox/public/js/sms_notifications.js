@@ -42,12 +42,48 @@ sms_inbox.update_count = function(count) {
 };
 
 sms_inbox.setup_realtime = function() {
+    // Inbox events are published once to the SMS Conversation doctype room
+    frappe.realtime.doctype_subscribe('SMS Conversation');
+
     frappe.realtime.on('new_sms', function(data) {
-        sms_inbox.update_count(data.new_count);
-        frappe.show_alert({ message: `<strong>New SMS from ${data.sender}</strong><br>${data.preview}`, indicator: 'blue' }, 10);
+        // Broadcast to every inbox user, so it carries the shared inbound total rather than this user's count
+        sms_inbox.update_count(Math.max(data.inbound_total - (frappe.boot.sms_read_total || 0), 0));
+        const count = (data.events || []).length;
+        const message = count > 1
+            ? `<strong>${count} new SMS</strong><br>Latest from ${frappe.utils.escape_html(data.sender)}: ${frappe.utils.escape_html(data.preview)}`
+            : `<strong>New SMS from ${frappe.utils.escape_html(data.sender)}</strong><br>${frappe.utils.escape_html(data.preview)}`;
+        frappe.show_alert({ message, indicator: 'blue' }, 10);
     });
     
     frappe.realtime.on('sms_unread_count_update', function(data) {
+        frappe.boot.sms_read_total = data.read_total;
         sms_inbox.update_count(data.new_count);
     });
 };
+
+// SMS count in the sidebar of records messages can be attached to (ATTACH_DOCTYPES on the server)
+['Opportunity', 'Lead', 'Project', 'Customer', 'Contact'].forEach(function(doctype) {
+    frappe.ui.form.on(doctype, 'refresh', function(frm) {
+        sms_inbox.show_sidebar_count(frm);
+    });
+});
+
+sms_inbox.show_sidebar_count = function(frm) {
+    const $sidebar = frm.sidebar && frm.sidebar.sidebar;
+    if (!$sidebar || frm.is_new()) return;
+
+    frappe.call({
+        method: 'sms_inbox.api.timeline.get_record_sms_count',
+        args: { doctype: frm.doctype, name: frm.docname },
+        callback: function(r) {
+            $sidebar.find('.sms-inbox-record-count').remove();
+            if (!r.message) return;
+            const route = `/app/sms-log?linked_doctype=${encodeURIComponent(frm.doctype)}&linked_name=${encodeURIComponent(frm.docname)}`;
+            $(`
+                <ul class="list-unstyled sidebar-menu sms-inbox-record-count">
+                    <li><a href="${route}">${r.message} SMS</a></li>
+                </ul>
+            `).appendTo($sidebar);
+        }
+    });
+};
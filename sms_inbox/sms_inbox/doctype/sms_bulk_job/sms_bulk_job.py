@@ -0,0 +1,26 @@
+import frappe
+from frappe.model.document import Document
+from frappe.utils import now_datetime
+
+from sms_inbox.utils.realtime import publish_realtime
+
+
+class SMSBulkJob(Document):
+    pass
+
+
+def record_bulk_result(job_name, status):
+    """Count one finished message against its job and complete the job when every message is done"""
+    if status not in ("Sent", "Failed"):
+        return
+    field = "sent_count" if status == "Sent" else "failed_count"
+    # Assignments apply left to right, so the status check sees the new count
+    frappe.db.sql(f"""
+        UPDATE `tabSMS Bulk Job`
+        SET {field} = {field} + 1,
+            status = IF(sent_count + failed_count >= total_count, 'Completed', 'Sending'),
+            modified = %s
+        WHERE name = %s
+    """, (now_datetime(), job_name))
+    job = frappe.db.get_value("SMS Bulk Job", job_name, ["name", "status", "total_count", "sent_count", "failed_count", "owner"], as_dict=True)
+    publish_realtime("sms_bulk_progress", job, user=job.owner, after_commit=True)
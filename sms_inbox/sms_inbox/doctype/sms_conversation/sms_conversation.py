@@ -0,0 +1,214 @@
+import frappe
+from frappe.model.document import Document
+from frappe.utils import add_to_date, cint, get_datetime, now_datetime
+
+INBOUND_TOTAL_KEY = "sms_inbox:inbound_total"
+READ_TOTAL_KEY = "sms_inbox:read_total:{}"
+RECONCILE_WINDOW_HOURS = 2
+
+# A user's unread count for conversation `c` joined to their SMS Read Marker `m`
+UNREAD_COUNT_SQL = "GREATEST(c.inbound_count - COALESCE(m.read_inbound_count, c.baseline_read_count), 0)"
+READ_MARKER_JOIN = "LEFT JOIN `tabSMS Read Marker` m ON m.conversation = c.name AND m.user = %(user)s"
+
+# Only adjust a counter that already exists; a missing one is rebuilt from the table on read
+ADJUST_COUNTER_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+
+class SMSConversation(Document):
+    pass
+
+
+def update_conversation(log):
+    """Fold a newly written SMS Log row into its conversation summary"""
+    phone = log.phone_key
+    inbound = 1 if log.direction == "Inbound" else 0
+    values = {
+        "last_message": log.message,
+        "direction": log.direction,
+        "last_message_time": log.sent_at,
+        "last_sms_log": log.name,
+        "linked_doctype": log.linked_doctype,
+        "linked_name": log.linked_name
+    }
+    # The last number we used or the customer texted becomes the conversation's sticky sender
+    if log.get("sender_number"):
+        values["sender_number"] = log.sender_number
+
+    current = frappe.db.get_value("SMS Conversation", phone, ["last_message_time", "contact_name"], as_dict=True)
+    if not current:
+        try:
+            frappe.get_doc({"doctype": "SMS Conversation", "phone_number": phone, "contact_name": log.contact_name, "inbound_count": inbound, **values}).insert(ignore_permissions=True)
+            adjust_counter(INBOUND_TOTAL_KEY, inbound)
+            return
+        except frappe.DuplicateEntryError:
+            current = frappe.db.get_value("SMS Conversation", phone, ["last_message_time", "contact_name"], as_dict=True)
+
+    if not current.last_message_time or get_datetime(log.sent_at) >= current.last_message_time:
+        values["contact_name"] = log.contact_name or current.contact_name
+        frappe.db.set_value("SMS Conversation", phone, values)
+    if inbound:
+        frappe.db.sql("UPDATE `tabSMS Conversation` SET inbound_count = inbound_count + 1, modified = %s WHERE name = %s", (now_datetime(), phone))
+        adjust_counter(INBOUND_TOTAL_KEY, 1)
+
+
+def mark_read(phone_key, user=None):
+    """Move the user's watermark past every inbound message in the conversation"""
+    _set_read_marker(phone_key, user, "c.inbound_count")
+
+
+def mark_unread(phone_key, user=None):
+    """Move the user's watermark back so the latest inbound message counts as unread"""
+    _set_read_marker(phone_key, user, "GREATEST(c.inbound_count - 1, 0)")
+
+
+def _set_read_marker(phone_key, user, read_count_sql):
+    user = user or frappe.session.user
+    values = {"phone": phone_key, "user": user}
+    current = frappe.db.sql(f"""
+        SELECT COALESCE(m.read_inbound_count, c.baseline_read_count), {read_count_sql}
+        FROM `tabSMS Conversation` c {READ_MARKER_JOIN}
+        WHERE c.name = %(phone)s
+    """, values)
+    if not current:
+        return
+    previous, read_count = current[0]
+    now = now_datetime()
+    frappe.db.sql("""
+        INSERT INTO `tabSMS Read Marker`
+            (name, user, conversation, last_read_at, read_inbound_count, creation, modified, owner, modified_by, docstatus, idx)
+        VALUES (%(name)s, %(user)s, %(phone)s, %(now)s, %(read_count)s, %(now)s, %(now)s, %(user)s, %(user)s, 0, 0)
+        ON DUPLICATE KEY UPDATE
+            last_read_at = VALUES(last_read_at), read_inbound_count = VALUES(read_inbound_count), modified = VALUES(modified)
+    """, dict(values, name=frappe.generate_hash(length=10), now=now, read_count=read_count))
+    adjust_counter(READ_TOTAL_KEY.format(user), read_count - previous)
+
+
+def get_unread_total(user=None):
+    """Unread inbound messages for user: every inbound message minus the ones they have read"""
+    user = user or frappe.session.user
+    return max(get_inbound_total() - get_read_total(user), 0)
+
+
+def get_inbound_total():
+    return _get_counter(INBOUND_TOTAL_KEY, "SELECT COALESCE(SUM(inbound_count), 0) FROM `tabSMS Conversation`")
+
+
+def get_read_total(user=None):
+    user = user or frappe.session.user
+    return _get_counter(READ_TOTAL_KEY.format(user), f"""
+        SELECT COALESCE(SUM(COALESCE(m.read_inbound_count, c.baseline_read_count)), 0)
+        FROM `tabSMS Conversation` c {READ_MARKER_JOIN}
+    """, {"user": user})
+
+
+def _get_counter(key, query, values=None):
+    """Serve a counter from redis, rebuilding it from the tables when missing"""
+    cache = frappe.cache()
+    value = cache.get(cache.make_key(key))
+    if value is not None:
+        return cint(value)
+    value = cint(frappe.db.sql(query, values)[0][0])
+    cache.set(cache.make_key(key), value)
+    return value
+
+
+def adjust_counter(key, delta):
+    """Apply delta to a redis counter once the current transaction commits"""
+    if not delta:
+        return
+    cache = frappe.cache()
+    key = cache.make_key(key)
+    frappe.db.after_commit.add(lambda: cache.eval(ADJUST_COUNTER_SCRIPT, 1, key, delta))
+
+
+def invalidate_inbound_total():
+    frappe.db.after_commit.add(lambda: frappe.cache().delete_value(INBOUND_TOTAL_KEY))
+
+
+def invalidate_unread_totals():
+    """Drop the inbound total and every user's read total; only needed when read markers or baselines change"""
+    def invalidate():
+        frappe.cache().delete_value(INBOUND_TOTAL_KEY)
+        frappe.cache().delete_keys(READ_TOTAL_KEY.format(""))
+    frappe.db.after_commit.add(invalidate)
+
+
+def reconcile_unread_counts():
+    """Scheduled: recount recently active conversations, clamp stale read markers and rebuild the redis totals"""
+    refresh_conversations(frappe.get_all(
+        "SMS Conversation",
+        filters={"last_message_time": [">=", add_to_date(now_datetime(), hours=-RECONCILE_WINDOW_HOURS)]},
+        pluck="name"
+    ))
+    frappe.db.sql("""
+        UPDATE `tabSMS Read Marker` m
+        JOIN `tabSMS Conversation` c ON c.name = m.conversation
+        SET m.read_inbound_count = c.inbound_count
+        WHERE m.read_inbound_count > c.inbound_count
+    """)
+    invalidate_unread_totals()
+    frappe.db.commit()
+
+
+def refresh_conversations(phone_keys=None):
+    """Recompute summaries from SMS Log and its archive in one set-based upsert (all conversations when phone_keys is None)
+
+    baseline_read_count is only set when a conversation is created: it
+    carries the legacy per-row read flags over for users without a marker.
+    """
+    if phone_keys is not None:
+        phone_keys = tuple(set(filter(None, phone_keys)))
+        if not phone_keys:
+            return
+    condition = "AND phone_key IN %(phones)s" if phone_keys else ""
+
+    frappe.db.sql(f"""
+        INSERT INTO `tabSMS Conversation`
+            (name, phone_number, contact_name, last_message, direction, last_message_time, last_sms_log,
+             linked_doctype, linked_name, inbound_count, baseline_read_count, creation, modified, owner, modified_by, docstatus, idx)
+        SELECT l.phone_key, l.phone_key, l.contact_name, l.message, l.direction, l.sent_at, l.name,
+            l.linked_doctype, l.linked_name, COALESCE(u.inbound_count, 0), COALESCE(u.read_count, 0),
+            %(now)s, %(now)s, %(user)s, %(user)s, 0, 0
+        FROM (
+            SELECT name, phone_key, contact_name, message, direction, sent_at, linked_doctype, linked_name,
+                ROW_NUMBER() OVER (PARTITION BY phone_key ORDER BY sent_at DESC, name DESC) AS rn
+            FROM (
+                SELECT name, phone_key, contact_name, message, direction, sent_at, linked_doctype, linked_name FROM `tabSMS Log`
+                WHERE phone_key IS NOT NULL AND phone_key != '' {condition}
+                UNION ALL
+                SELECT name, phone_key, contact_name, message, direction, sent_at, linked_doctype, linked_name FROM `tabSMS Log Archive`
+                WHERE phone_key IS NOT NULL AND phone_key != '' {condition}
+            ) logs
+        ) l
+        LEFT JOIN (
+            SELECT phone_key, SUM(inbound_count) AS inbound_count, SUM(read_count) AS read_count FROM (
+                SELECT phone_key, COUNT(*) AS inbound_count, SUM(`read`) AS read_count FROM `tabSMS Log`
+                WHERE direction = 'Inbound' {condition}
+                GROUP BY phone_key
+                UNION ALL
+                SELECT phone_key, COUNT(*) AS inbound_count, SUM(`read`) AS read_count FROM `tabSMS Log Archive`
+                WHERE direction = 'Inbound' {condition}
+                GROUP BY phone_key
+            ) counts
+            GROUP BY phone_key
+        ) u ON u.phone_key = l.phone_key
+        WHERE l.rn = 1
+        ON DUPLICATE KEY UPDATE
+            contact_name = VALUES(contact_name), last_message = VALUES(last_message), direction = VALUES(direction),
+            last_message_time = VALUES(last_message_time), last_sms_log = VALUES(last_sms_log),
+            linked_doctype = VALUES(linked_doctype), linked_name = VALUES(linked_name),
+            inbound_count = VALUES(inbound_count), modified = VALUES(modified), modified_by = VALUES(modified_by)
+    """, {"phones": phone_keys, "now": now_datetime(), "user": frappe.session.user})
+    # Markers and existing baselines are untouched, so per-user read totals stay valid
+    invalidate_inbound_total()
+
+
+def rebuild_conversations():
+    frappe.db.delete("SMS Conversation")
+    refresh_conversations()
+    invalidate_unread_totals()
@@ -1,8 +1,23 @@
 import frappe
 from frappe.model.document import Document
 
+from sms_inbox.utils.settings import clear_settings_cache
+
+
 class SMSInboxSettings(Document):
     def validate(self):
-        if self.enabled and (not self.account_sid or not self.auth_token or not self.phone_number):
+        has_sender = self.phone_number or self.messaging_service_sid or any(row.enabled for row in self.sender_numbers)
+        if self.enabled and (not self.account_sid or not self.auth_token or not has_sender):
             frappe.throw("Please fill in all Twilio credentials to enable SMS")
 
+        seen = set()
+        for row in self.sender_numbers:
+            row.phone_number = (row.phone_number or "").strip()
+            if row.phone_number in seen:
+                frappe.throw(f"Sender number {row.phone_number} is listed more than once")
+            seen.add(row.phone_number)
+
+    def on_update(self):
+        clear_settings_cache()
+        # A reader between now and commit may cache the old values again
+        frappe.db.after_commit.add(clear_settings_cache)
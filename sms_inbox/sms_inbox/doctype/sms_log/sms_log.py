@@ -1,5 +1,45 @@
 import frappe
 from frappe.model.document import Document
+from frappe.utils import cint
+
+from sms_inbox.utils.encoding import analyze_message
+from sms_inbox.utils.phone import get_phone_key
+
+# tabSeries key and width of the "format:SMS-{#####}" naming rule
+LOG_NAME_SERIES = "SMS-"
+LOG_NAME_DIGITS = 5
+
 
 class SMSLog(Document):
-    pass
+    def validate(self):
+        self.phone_key = get_phone_key(self.phone_number)
+        analysis = analyze_message(self.message)
+        self.encoding, self.segments = analysis.encoding, analysis.segments
+
+
+def reserve_log_names(count):
+    """Take count names from the SMS-##### series in one short transaction of its own
+
+    Bulk writers use this instead of naming rows one by one, which would
+    hold the series row lock (and block every webhook insert) until their
+    final commit. It commits the current transaction, so call it before
+    writing anything else.
+    """
+    if not count:
+        return []
+    frappe.db.commit()
+    frappe.db.sql("INSERT INTO `tabSeries` (name, current) VALUES (%s, 0) ON DUPLICATE KEY UPDATE name = name", (LOG_NAME_SERIES,))
+    frappe.db.sql("UPDATE `tabSeries` SET current = current + %s WHERE name = %s", (count, LOG_NAME_SERIES))
+    last = cint(frappe.db.sql("SELECT current FROM `tabSeries` WHERE name = %s", (LOG_NAME_SERIES,))[0][0])
+    frappe.db.commit()
+    return [f"{LOG_NAME_SERIES}{str(n).zfill(LOG_NAME_DIGITS)}" for n in range(last - count + 1, last + 1)]
+
+
+def on_doctype_update():
+    frappe.db.add_index("SMS Log", ["phone_key", "sent_at"])
+    frappe.db.add_index("SMS Log", ["linked_doctype", "linked_name", "sent_at"])
+    frappe.db.add_index("SMS Log", ["direction", "`read`"], "direction_read_index")
+    # Outbound queue claims (ordered by sent_at) and the Pending/Sending sweeps in requeue_outbound
+    frappe.db.add_index("SMS Log", ["direction", "status", "sent_at"], "direction_status_sent_at_index")
+    if not frappe.db.has_index("tabSMS Log", "message_fulltext"):
+        frappe.db.sql_ddl("ALTER TABLE `tabSMS Log` ADD FULLTEXT INDEX `message_fulltext` (message, contact_name, phone_key)")
@@ -0,0 +1,13 @@
+import frappe
+from frappe.model.document import Document
+
+
+class SMSLogArchive(Document):
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_index("SMS Log Archive", ["phone_key", "sent_at"])
+    frappe.db.add_index("SMS Log Archive", ["linked_doctype", "linked_name", "sent_at"])
+    if not frappe.db.has_index("tabSMS Log Archive", "message_fulltext"):
+        frappe.db.sql_ddl("ALTER TABLE `tabSMS Log Archive` ADD FULLTEXT INDEX `message_fulltext` (message, contact_name, phone_key)")
@@ -0,0 +1,10 @@
+import frappe
+from frappe.model.document import Document
+
+
+class SMSReadMarker(Document):
+    pass
+
+
+def on_doctype_update():
+    frappe.db.add_unique("SMS Read Marker", ["user", "conversation"], "user_conversation_unique")
@@ -28,9 +28,15 @@ class SMSConversations {
         this.current_conversation = null;
         this.conversations = [];
         this.search_text = '';
+        this.search_results = null;
+        this.search_cursor = null;
         this.selection_mode = false;
         this.selected_message_names = new Set();
         this.last_messages = [];
+        this.page_size = 50;
+        this.conversations_cursor = null;
+        this.messages_cursor = null;
+        this.sync_cursor = null;
         this.setup_layout();
         this.setup_realtime();
         this.load_conversations();
@@ -46,6 +52,8 @@ class SMSConversations {
                 .conversation-item { padding: 12px 15px; border-bottom: 1px solid #eee; cursor: pointer; }
                 .conversation-item:hover { background: #f5f7fa; }
                 .conversation-item.active { background: #e8f0fe; }
+                .search-snippet { margin-top: 4px; }
+                .search-snippet mark { padding: 0; background: #fff3b0; }
                 .unread-badge { background: #e74c3c; color: white; border-radius: 10px; padding: 2px 8px; font-size: 11px; }
                 .chat-container { flex: 1; display: flex; flex-direction: column; background: #fff; }
                 .chat-header { padding: 15px; border-bottom: 1px solid #d1d8dd; background: #f5f7fa; display: flex; justify-content: space-between; align-items: center; }
@@ -64,6 +72,8 @@ class SMSConversations {
                 .chat-input { padding: 15px; border-top: 1px solid #d1d8dd; display: flex; gap: 10px; }
                 .chat-input textarea { flex: 1; border-radius: 20px; padding: 10px 15px; border: 1px solid #d1d8dd; resize: none; }
                 .chat-input button { border-radius: 20px; padding: 10px 20px; }
+                .chat-encoding { padding: 0 20px 8px; font-size: 11px; color: #8d99a6; min-height: 16px; }
+                .chat-encoding.ucs2 { color: #e67e22; }
                 .date-separator { text-align: center; margin: 20px 0; color: #8d99a6; font-size: 12px; }
                 .empty-state { display: flex; flex-direction: column; align-items: center; justify-content: center; height: 100%; color: #8d99a6; }
             </style>
@@ -83,51 +93,230 @@ class SMSConversations {
             </div>
         `);
 
+        const search = frappe.utils.debounce(() => this.search_messages(), 300);
         this.$container.find('.conversations-search').on('input', (e) => {
-            this.search_text = (e.currentTarget.value || '').toLowerCase();
-            this.render_conversations(this.conversations);
+            this.search_text = (e.currentTarget.value || '').trim();
+            if (this.search_text.length < 2) {
+                this.search_results = null;
+                this.render_conversations(this.conversations);
+                return;
+            }
+            search();
         });
 
         this.$container.find('.new-message-btn').on('click', () => this.show_new_message_dialog());
+
+        this.$container.find('.conversations-list').on('scroll', (e) => {
+            const el = e.currentTarget;
+            if (el.scrollTop + el.clientHeight < el.scrollHeight - 50) return;
+            if (this.search_results) this.load_more_search_results();
+            else this.load_more_conversations();
+        });
     }
 
     setup_realtime() {
+        frappe.realtime.doctype_subscribe('SMS Conversation');
         frappe.realtime.on('new_sms', (data) => {
             if (!data) return;
-            this.load_conversations();
-            if (this.current_conversation?.phone_number === data.phone) {
-                this.load_conversation(this.current_conversation);
+            const events = data.events || [data];
+            // Unread counts are per user; the payload can only be patched onto conversations we already hold
+            if (!events.every(e => e.message && e.conversation && this.conversations.some(c => c.phone_number === e.phone))) {
+                this.sync_changes();
+                return;
             }
+            this.apply_changes(events.map(e => e.conversation), events.map(e => e.message));
+        });
+
+        frappe.realtime.on('sms_unread_count_update', () => this.sync_changes());
+
+        frappe.realtime.on('sms_attach_progress', (data) => {
+            if (!data) return;
+            if (data.done < data.total) {
+                frappe.show_progress(__('Attaching Messages'), data.done, data.total, `${data.target_doctype}: ${data.target_name}`);
+                return;
+            }
+            frappe.hide_progress();
+            frappe.show_alert({ message: `Attached ${data.total} messages to ${data.target_doctype}: ${data.target_name}`, indicator: 'green' });
+            this.sync_changes();
+        });
+
+        frappe.realtime.on('sms_status_update', (data) => {
+            if (!data || this.current_conversation?.phone_number !== data.phone) return;
+            const message = this.last_messages.find(m => m.name === data.name);
+            if (!message) return;
+            message.status = data.status;
+            this.render_messages(this.last_messages);
         });
     }
 
     load_conversations() {
         frappe.call({
-            method: 'sms_inbox.api.twilio.get_conversations',
+            method: 'sms_inbox.api.twilio.get_conversations_page',
+            args: { limit: this.page_size },
             callback: (r) => {
                 if (r.message) {
-                    this.conversations = r.message || [];
-                    this.render_conversations(r.message);
+                    this.conversations = r.message.conversations || [];
+                    this.conversations_cursor = r.message.next_cursor;
+                    this.sync_cursor = r.message.sync_cursor;
+                    if (!this.search_results) this.render_conversations(this.conversations);
                 }
             }
         });
     }
 
-    render_conversations(conversations) {
+    load_more_conversations() {
+        if (!this.conversations_cursor || this.loading_conversations) return;
+        this.loading_conversations = true;
+        frappe.call({
+            method: 'sms_inbox.api.twilio.get_conversations_page',
+            args: { ...this.conversations_cursor, limit: this.page_size },
+            callback: (r) => {
+                if (r.message) {
+                    // Delta syncs may already have patched some of these in
+                    const known = new Set(this.conversations.map(c => c.phone_number));
+                    this.conversations = this.conversations.concat((r.message.conversations || []).filter(c => !known.has(c.phone_number)));
+                    this.conversations_cursor = r.message.next_cursor;
+                    this.render_conversations(this.conversations);
+                }
+            },
+            always: () => { this.loading_conversations = false; }
+        });
+    }
+
+    sync_changes() {
+        if (!this.sync_cursor) return this.load_conversations();
+        const phone_number = this.current_conversation?.phone_number;
+        frappe.call({
+            method: 'sms_inbox.api.twilio.get_changes_since',
+            args: { cursor: this.sync_cursor, phone_number },
+            callback: (r) => {
+                if (!r.message) return;
+                if (r.message.has_more) return this.refresh();
+                if (r.message.sync_cursor > this.sync_cursor) this.sync_cursor = r.message.sync_cursor;
+                this.apply_changes(r.message.conversations || [], phone_number === this.current_conversation?.phone_number ? r.message.messages || [] : []);
+            }
+        });
+    }
+
+    apply_changes(conversations, messages) {
+        const oldest = this.conversations_cursor && this.conversations[this.conversations.length - 1]?.last_message_time;
+        conversations.forEach(conv => {
+            const existing = this.conversations.find(c => c.phone_number === conv.phone_number);
+            if (existing && conv.unread_count === undefined) {
+                conv = { ...conv, unread_count: existing.unread_count + conv.inbound_count - existing.inbound_count };
+            }
+            if (existing) Object.assign(existing, conv);
+            // Rows older than the loaded window arrive through load_more_conversations instead
+            else if (!oldest || conv.last_message_time >= oldest) this.conversations.push(conv);
+        });
+        this.conversations.sort((a, b) => (b.last_message_time || '').localeCompare(a.last_message_time || '') || b.name.localeCompare(a.name));
+
+        const current = this.current_conversation;
+        if (current) {
+            const updated = this.conversations.find(c => c.phone_number === current.phone_number);
+            if (updated && updated !== current) Object.assign(current, updated);
+        }
+        if (!this.search_results) this.render_conversations(this.conversations);
+
+        const thread = messages.filter(m => m.phone_key === current?.phone_number);
+        if (!thread.length) return;
+        thread.forEach(m => {
+            const index = this.last_messages.findIndex(existing => existing.name === m.name);
+            if (index >= 0) this.last_messages[index] = m;
+            else this.last_messages.push(m);
+        });
+        this.last_messages.sort((a, b) => a.sent_at.localeCompare(b.sent_at) || a.name.localeCompare(b.name));
+        this.render_messages(this.last_messages);
+        if (current.unread_count > 0) {
+            frappe.call({ method: 'sms_inbox.api.twilio.mark_conversation_read', args: { phone_number: current.phone_number } });
+        }
+    }
+
+    search_messages() {
+        const query = this.search_text;
+        if (query.length < 2) return;
+        frappe.call({
+            method: 'sms_inbox.api.search.search_sms',
+            args: { query, limit: this.page_size },
+            callback: (r) => {
+                if (!r.message || query !== this.search_text) return;
+                this.search_results = r.message.conversations || [];
+                this.search_cursor = r.message.next_cursor;
+                this.render_search_results(this.search_results);
+            }
+        });
+    }
+
+    load_more_search_results() {
+        if (!this.search_cursor || this.loading_search) return;
+        const query = this.search_text;
+        this.loading_search = true;
+        frappe.call({
+            method: 'sms_inbox.api.search.search_sms',
+            args: { query, ...this.search_cursor, limit: this.page_size },
+            callback: (r) => {
+                if (!r.message || query !== this.search_text || !this.search_results) return;
+                (r.message.conversations || []).forEach(result => {
+                    const existing = this.search_results.find(c => c.phone_number === result.phone_number);
+                    if (existing) existing.matches = existing.matches.concat(result.matches);
+                    else this.search_results.push(result);
+                });
+                this.search_cursor = r.message.next_cursor;
+                this.render_search_results(this.search_results);
+            },
+            always: () => { this.loading_search = false; }
+        });
+    }
+
+    render_search_results(results) {
         const $items = this.$container.find('.conversations-items');
         $items.empty();
 
-        const filtered = (conversations || []).filter((c) => {
-            if (!this.search_text) return true;
-            return [c.contact_name, c.phone_number, c.last_message].filter(Boolean).join(' ').toLowerCase().includes(this.search_text);
+        if (results.length === 0) {
+            $items.html('<div class="p-3 text-muted">No matching messages</div>');
+            return;
+        }
+
+        results.forEach(result => {
+            const name = result.contact_name || result.phone_number;
+            // Snippets are escaped server-side; only the <mark> tags are HTML
+            const snippets = result.matches.slice(0, 3).map(m => `
+                <div class="text-muted small search-snippet">${m.direction === 'Inbound' ? '←' : '→'} ${m.snippet}</div>
+            `).join('');
+            const more = result.matches.length > 3 ? `<div class="text-muted small">+${result.matches.length - 3} more</div>` : '';
+
+            $items.append(`
+                <div class="conversation-item" data-phone="${frappe.utils.escape_html(result.phone_number)}">
+                    <div class="d-flex justify-content-between align-items-center">
+                        <strong>${frappe.utils.escape_html(name)}</strong>
+                        <span class="text-muted small">${frappe.datetime.prettyDate(result.matches[0].sent_at)}</span>
+                    </div>
+                    ${snippets}
+                    ${more}
+                </div>
+            `);
         });
 
-        if (filtered.length === 0) {
+        $items.find('.conversation-item').click((e) => {
+            const phone = String($(e.currentTarget).data('phone'));
+            const result = results.find(c => c.phone_number === phone);
+            const conv = this.conversations.find(c => c.phone_number === phone) || { phone_number: phone, contact_name: result?.contact_name, unread_count: 0 };
+            this.load_conversation(conv);
+            $items.find('.conversation-item').removeClass('active');
+            $(e.currentTarget).addClass('active');
+        });
+    }
+
+    render_conversations(conversations) {
+        const $items = this.$container.find('.conversations-items');
+        $items.empty();
+
+        if (!conversations || conversations.length === 0) {
             $items.html('<div class="p-3 text-muted">No conversations</div>');
             return;
         }
 
-        filtered.forEach(conv => {
+        conversations.forEach(conv => {
             const name = conv.contact_name || conv.phone_number;
             const time = frappe.datetime.prettyDate(conv.last_message_time);
             const preview = (conv.last_message || '').substring(0, 40) + ((conv.last_message || '').length > 40 ? '...' : '');
@@ -162,12 +351,13 @@ class SMSConversations {
         this.selected_message_names = new Set();
 
         frappe.call({
-            method: 'sms_inbox.api.twilio.get_conversation_messages',
-            args: { phone_number: conv.phone_number },
+            method: 'sms_inbox.api.twilio.get_conversation_messages_page',
+            args: { phone_number: conv.phone_number, limit: this.page_size },
             callback: (r) => {
                 if (r.message) {
-                    this.last_messages = r.message;
-                    this.render_chat(conv, r.message);
+                    this.last_messages = r.message.messages || [];
+                    this.messages_cursor = r.message.next_cursor;
+                    this.render_chat(conv, this.last_messages);
                     if (conv.unread_count > 0) {
                         frappe.call({ method: 'sms_inbox.api.twilio.mark_conversation_read', args: { phone_number: conv.phone_number } });
                     }
@@ -176,6 +366,26 @@ class SMSConversations {
         });
     }
 
+    load_older_messages() {
+        if (!this.messages_cursor || this.loading_messages || !this.current_conversation) return;
+        const phone_number = this.current_conversation.phone_number;
+        this.loading_messages = true;
+        frappe.call({
+            method: 'sms_inbox.api.twilio.get_conversation_messages_page',
+            args: { phone_number, ...this.messages_cursor, limit: this.page_size },
+            callback: (r) => {
+                if (!r.message || this.current_conversation?.phone_number !== phone_number) return;
+                const $msg = this.$container.find('.chat-messages');
+                const previous_height = $msg.prop('scrollHeight');
+                this.last_messages = (r.message.messages || []).concat(this.last_messages);
+                this.messages_cursor = r.message.next_cursor;
+                this.render_messages(this.last_messages);
+                $msg.scrollTop($msg.prop('scrollHeight') - previous_height);
+            },
+            always: () => { this.loading_messages = false; }
+        });
+    }
+
     render_chat(conv, messages) {
         const name = conv.contact_name || conv.phone_number;
         const $chat = this.$container.find('.chat-container');
@@ -198,14 +408,19 @@ class SMSConversations {
                 <textarea placeholder="Type a message..." rows="2"></textarea>
                 <button class="btn btn-primary send-btn">Send</button>
             </div>
+            <div class="chat-encoding"></div>
         `);
 
         this.render_messages(messages);
 
+        $chat.find('.chat-messages').on('scroll', (e) => {
+            if (e.currentTarget.scrollTop < 50) this.load_older_messages();
+        });
         $chat.find('.send-btn').click(() => this.send_message(conv.phone_number));
         $chat.find('textarea').keydown((e) => {
             if (e.key === 'Enter' && !e.shiftKey) { e.preventDefault(); this.send_message(conv.phone_number); }
         });
+        $chat.find('textarea').on('input', frappe.utils.debounce(() => this.show_encoding(), 300));
         $chat.find('.select-btn').click(() => this.toggle_selection_mode());
         $chat.find('.cancel-btn').click(() => this.toggle_selection_mode(false));
         $chat.find('.attach-selected-btn').click(() => this.show_attach_selected_dialog());
@@ -225,6 +440,7 @@ class SMSConversations {
             }
 
             const time = frappe.datetime.str_to_obj(m.sent_at).toLocaleTimeString([], {hour: '2-digit', minute:'2-digit'});
+            const status = m.direction === 'Outbound' && m.status && m.status !== 'Sent' ? ` · ${m.status}` : '';
             const sender = m.direction === 'Outbound' && m.sender_full_name ? `<div class="message-sender">${m.sender_full_name}</div>` : '';
             const linked = m.linked_doctype ? `<div class="message-linked">📎 ${m.linked_doctype}: ${m.linked_name}</div>` : '';
             const selected = this.selected_message_names.has(m.name);
@@ -237,7 +453,7 @@ class SMSConversations {
                         ${sender}
                         <div>${frappe.utils.escape_html(m.message)}</div>
                         ${linked}
-                        <div class="message-time">${time}</div>
+                        <div class="message-time">${time}${status}</div>
                     </div>
                     ${m.direction === 'Outbound' ? checkbox : ''}
                 </div>
@@ -275,6 +491,25 @@ class SMSConversations {
         }
     }
 
+    show_encoding() {
+        const message = this.$container.find('.chat-input textarea').val();
+        const $info = this.$container.find('.chat-encoding');
+        if (!message.trim()) { $info.removeClass('ucs2').empty(); return; }
+
+        frappe.call({
+            method: 'sms_inbox.api.twilio.analyze_sms',
+            args: { message },
+            callback: (r) => {
+                const a = r.message;
+                if (!a) return;
+                const parts = `${a.segments} segment${a.segments === 1 ? '' : 's'} · ${a.encoding}`;
+                // A single non-GSM character turns the whole message into UCS-2
+                const culprits = a.unsupported.length ? ` because of ${frappe.utils.escape_html(a.unsupported.join(' '))}` : '';
+                $info.toggleClass('ucs2', a.unsupported.length > 0).html(parts + culprits);
+            }
+        });
+    }
+
     send_message(phone_number) {
         const $textarea = this.$container.find('.chat-input textarea');
         const message = $textarea.val().trim();
@@ -289,8 +524,9 @@ class SMSConversations {
                 $btn.prop('disabled', false).text('Send');
                 if (r.message?.success) {
                     $textarea.val('');
-                    this.load_conversation(this.current_conversation);
-                    frappe.show_alert({ message: 'SMS sent!', indicator: 'green' });
+                    this.show_encoding();
+                    this.sync_changes();
+                    frappe.show_alert({ message: r.message.queued ? 'SMS queued' : 'SMS sent!', indicator: 'green' });
                 } else {
                     frappe.msgprint({ title: 'SMS Failed', message: r.message?.error || 'Failed to send SMS. Please check your Twilio settings.', indicator: 'red' });
                 }
@@ -316,7 +552,7 @@ class SMSConversations {
                     method: 'sms_inbox.api.twilio.send_sms',
                     args: { recipient_number: values.phone_number, message: values.message },
                     callback: (r) => {
-                        if (r.message?.success) { d.hide(); this.load_conversations(); frappe.show_alert({ message: 'SMS sent!', indicator: 'green' }); }
+                        if (r.message?.success) { d.hide(); this.sync_changes(); frappe.show_alert({ message: r.message.queued ? 'SMS queued' : 'SMS sent!', indicator: 'green' }); }
                         else { frappe.msgprint({ title: 'SMS Failed', message: r.message?.error || 'Failed to send SMS. Please check your Twilio settings.', indicator: 'red' }); }
                     },
                     error: (r) => {
@@ -347,7 +583,7 @@ class SMSConversations {
                 frappe.call({
                     method: 'sms_inbox.api.twilio.attach_conversation_to_record',
                     args: { phone_number, target_doctype: values.doctype, target_name: values.docname },
-                    callback: (r) => { if (r.message?.success) { d.hide(); frappe.show_alert({ message: r.message.message, indicator: 'green' }); this.load_conversation(this.current_conversation); } }
+                    callback: (r) => { if (r.message?.success) { d.hide(); frappe.show_alert({ message: r.message.message, indicator: 'green' }); this.sync_changes(); } }
                 });
             }
         });
@@ -368,7 +604,7 @@ class SMSConversations {
                 frappe.call({
                     method: 'sms_inbox.api.twilio.attach_sms_messages_to_record',
                     args: { message_names: names, target_doctype: values.doctype, target_name: values.docname },
-                    callback: (r) => { if (r.message?.success) { d.hide(); frappe.show_alert({ message: r.message.message, indicator: 'green' }); this.toggle_selection_mode(false); this.load_conversation(this.current_conversation); } }
+                    callback: (r) => { if (r.message?.success) { d.hide(); frappe.show_alert({ message: r.message.message, indicator: 'green' }); this.toggle_selection_mode(false); this.sync_changes(); } }
                 });
             }
         });
@@ -0,0 +1,89 @@
+"""
+SMS encoding and segment analysis
+
+A message goes out as GSM-7 (160 characters, 153 per part once split)
+unless any character falls outside the GSM 03.38 set, in which case the
+whole message becomes UCS-2 (70, then 67 per part). transliterate swaps
+the usual culprits pasted from word processors, like smart quotes and
+dashes, for GSM-7 equivalents.
+"""
+
+import re
+
+import frappe
+
+GSM7_BASIC = (
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+# Sent as an escape plus the character, so each takes two septets
+GSM7_EXTENDED = "^{}\\[~]|€\f"
+
+NON_GSM7 = re.compile(f"[^{re.escape(GSM7_BASIC + GSM7_EXTENDED)}]")
+GSM7_EXTENDED_CHARS = re.compile(f"[{re.escape(GSM7_EXTENDED)}]")
+ASTRAL_CHARS = re.compile("[\U00010000-\U0010FFFF]")
+
+# (single part limit, per part limit once concatenated)
+SEGMENT_LIMITS = {"GSM-7": (160, 153), "UCS-2": (70, 67)}
+
+TRANSLITERATIONS = str.maketrans({
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'", "´": "'", "`": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"', "«": '"', "»": '"',
+    "‐": "-", "‑": "-", "‒": "-", "–": "-", "—": "-", "―": "-", "−": "-",
+    "•": "-", "·": "-",
+    "…": "...",
+    "\u00a0": " ", "\u2002": " ", "\u2003": " ", "\u2009": " ", "\u202f": " ", "\t": " ",
+    "\u200b": "", "\u200c": "", "\u200d": "", "\ufeff": "",
+    "á": "a", "â": "a", "ã": "a", "ê": "e", "ë": "e", "í": "i", "î": "i",
+    "ï": "i", "ó": "o", "ô": "o", "õ": "o", "ú": "u", "û": "u", "ç": "Ç"
+})
+
+
+def transliterate(message):
+    return (message or "").translate(TRANSLITERATIONS)
+
+
+def analyze_message(message):
+    """Encoding, segment count, length in encoding units and the characters that force UCS-2"""
+    message = message or ""
+    unsupported = NON_GSM7.findall(message)
+    if unsupported:
+        encoding = "UCS-2"
+        # Characters outside the BMP are surrogate pairs: two UTF-16 units that can't be split
+        wide = len(ASTRAL_CHARS.findall(message))
+    else:
+        encoding = "GSM-7"
+        wide = len(GSM7_EXTENDED_CHARS.findall(message))
+    length = len(message) + wide
+    return frappe._dict({
+        "encoding": encoding,
+        "segments": _count_segments(message, length, wide, encoding),
+        "length": length,
+        "unsupported": sorted(set(unsupported))
+    })
+
+
+def analyze_messages(messages):
+    """analyze_message over a whole batch; rendered bulk messages repeat a lot, so each distinct text is analyzed once"""
+    seen = {}
+    for message in messages:
+        if message not in seen:
+            seen[message] = analyze_message(message)
+    return [seen[message] for message in messages]
+
+
+def _count_segments(message, length, wide, encoding):
+    single, multi = SEGMENT_LIMITS[encoding]
+    if length <= single:
+        return 1 if length else 0
+    if not wide:
+        return -(-length // multi)
+    # Two-unit characters never straddle a part boundary, so pack them greedily
+    double = ASTRAL_CHARS if encoding == "UCS-2" else GSM7_EXTENDED_CHARS
+    segments, used = 1, 0
+    for char in message:
+        units = 2 if double.match(char) else 1
+        if used + units > multi:
+            segments, used = segments + 1, 0
+        used += units
+    return segments
@@ -0,0 +1,155 @@
+"""
+Hot-path metrics kept in redis
+
+Every series is a field of one redis hash, named in Prometheus exposition
+form (e.g. sms_inbox_endpoint_duration_seconds_count{method="send_sms"}),
+so exporting is a single HGETALL. Histogram buckets are written
+cumulatively. Endpoint timings are sampled at `metrics_sample_rate`;
+Twilio requests and realtime publishes are counted on every call while
+that rate is above zero.
+"""
+
+import random
+import time
+from functools import wraps
+
+import frappe
+from frappe.utils import flt
+
+from sms_inbox.utils.settings import get_settings
+
+METRICS_KEY = "sms_inbox:metrics"
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def get_sample_rate():
+    try:
+        return flt(get_settings().metrics_sample_rate)
+    except Exception:
+        return 0
+
+
+def instrument(fn):
+    """Record wall time, DB query count/time and errors for a sampled share of calls"""
+    method = fn.__name__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if frappe.local.flags.sms_metrics_active or random.random() >= get_sample_rate():
+            return fn(*args, **kwargs)
+
+        frappe.local.flags.sms_metrics_active = True
+        queries = QueryTimer(frappe.local.db)
+        failed = False
+        started = time.perf_counter()
+        try:
+            with queries:
+                return fn(*args, **kwargs)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            frappe.local.flags.sms_metrics_active = False
+            record_endpoint(method, time.perf_counter() - started, queries, failed)
+
+    return wrapper
+
+
+class QueryTimer:
+    """Counts and times every frappe.db.sql call made inside the block"""
+
+    def __init__(self, db):
+        self.db = db
+        self.count = 0
+        self.seconds = 0.0
+
+    def __enter__(self):
+        sql = self.db.sql
+
+        def timed_sql(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return sql(*args, **kwargs)
+            finally:
+                self.count += 1
+                self.seconds += time.perf_counter() - started
+
+        # Shadow the bound method on this connection only; __exit__ removes it again
+        self.db.sql = timed_sql
+        return self
+
+    def __exit__(self, *exc):
+        del self.db.sql
+
+
+def record_endpoint(method, seconds, queries, failed):
+    def write(pipe, key):
+        _observe(pipe, key, "sms_inbox_endpoint_duration_seconds", seconds, method=method)
+        _observe(pipe, key, "sms_inbox_endpoint_db_duration_seconds", queries.seconds, method=method)
+        pipe.hincrby(key, series("sms_inbox_endpoint_db_queries_total", method=method), queries.count)
+        if failed:
+            pipe.hincrby(key, series("sms_inbox_endpoint_errors_total", method=method), 1)
+    _write(write)
+
+
+def record_twilio_request(method, seconds, status, error_code=None):
+    if get_sample_rate() <= 0:
+        return
+
+    def write(pipe, key):
+        _observe(pipe, key, "sms_inbox_twilio_request_duration_seconds", seconds, method=method)
+        pipe.hincrby(key, series("sms_inbox_twilio_responses_total", status=status, code=error_code or ""), 1)
+    _write(write)
+
+
+def count(name, value=1, **labels):
+    if get_sample_rate() <= 0:
+        return
+    _write(lambda pipe, key: pipe.hincrby(key, series(name, **labels), value))
+
+
+def get_series():
+    cache = frappe.cache()
+    values = cache.hgetall(cache.make_key(METRICS_KEY))
+    return {field.decode(): _number(value.decode()) for field, value in values.items()}
+
+
+def reset_series():
+    cache = frappe.cache()
+    cache.delete(cache.make_key(METRICS_KEY))
+
+
+def series(name, **labels):
+    if not labels:
+        return name
+    pairs = ",".join(f'{label}="{_label_value(value)}"' for label, value in labels.items())
+    return f"{name}{{{pairs}}}"
+
+
+def _label_value(value):
+    return str(value).replace("\\", "").replace('"', "")
+
+
+def _observe(pipe, key, name, seconds, **labels):
+    for le in BUCKETS:
+        if seconds <= le:
+            pipe.hincrby(key, series(f"{name}_bucket", **labels, le=le), 1)
+    pipe.hincrby(key, series(f"{name}_bucket", **labels, le="+Inf"), 1)
+    pipe.hincrby(key, series(f"{name}_count", **labels), 1)
+    pipe.hincrbyfloat(key, series(f"{name}_sum", **labels), seconds)
+
+
+def _write(write):
+    # Metrics must never break the call they measure
+    try:
+        cache = frappe.cache()
+        pipe = cache.pipeline()
+        write(pipe, cache.make_key(METRICS_KEY))
+        pipe.execute()
+    except Exception:
+        pass
+
+
+def _number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
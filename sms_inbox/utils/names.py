@@ -0,0 +1,91 @@
+"""
+Display name resolution for SMS Log rows
+
+Names are resolved in one batched query per call and kept in a small
+per-process LRU cache with a TTL. Saving a User/Contact evicts its entry
+in the current process; other workers pick the change up within the TTL.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+import frappe
+
+NAME_FIELDS = {"User": "full_name", "Contact": "full_name"}
+NAME_CACHE_TTL = 300
+NAME_CACHE_SIZE = 4096
+
+
+class TTLCache:
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if not item:
+                return default
+            if item[1] < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + self.ttl)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_names = TTLCache(NAME_CACHE_SIZE, NAME_CACHE_TTL)
+_MISSING = object()
+
+
+def get_display_names(doctype, names):
+    """Return {name: display name} for the given User/Contact names"""
+    site = frappe.local.site
+    resolved, missing = {}, []
+    for name in set(filter(None, names)):
+        value = _names.get((site, doctype, name), _MISSING)
+        if value is _MISSING:
+            missing.append(name)
+        else:
+            resolved[name] = value
+
+    if missing:
+        field = NAME_FIELDS[doctype]
+        found = dict(frappe.get_all(doctype, filters={"name": ["in", missing]}, fields=["name", field], as_list=True))
+        for name in missing:
+            resolved[name] = found.get(name) or None
+            _names.set((site, doctype, name), resolved[name])
+    return resolved
+
+
+def get_user_full_names(users):
+    return get_display_names("User", users)
+
+
+def set_sender_full_names(rows):
+    """Set sender_full_name on outbound SMS Log rows"""
+    senders = get_user_full_names(r.sent_by for r in rows if r.direction == "Outbound" and r.sent_by)
+    for r in rows:
+        r.sender_full_name = senders.get(r.sent_by) if r.direction == "Outbound" and r.sent_by else None
+    return rows
+
+
+def clear_display_name(doc, method=None):
+    _names.pop((frappe.local.site, doc.doctype, doc.name))
@@ -0,0 +1,27 @@
+"""
+Keyset pagination helpers
+
+Pages are ordered by (time, name) descending; the cursor is the last
+row's (before_sent_at, before_name).
+"""
+
+from frappe.utils import cint
+
+KEYSET_CONDITION = "({field} < %(before)s OR ({field} = %(before)s AND {name} < %(name)s))"
+
+
+def page_limit(limit, default=50, maximum=200):
+    return max(1, min(cint(limit) or default, maximum))
+
+
+def keyset_condition(field="sent_at", name="name"):
+    return KEYSET_CONDITION.format(field=field, name=name)
+
+
+def keyset_page(rows, limit, time_field):
+    """Trim a limit + 1 fetch to limit rows and build the cursor for the next page"""
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = {"before_sent_at": str(rows[-1][time_field]), "before_name": rows[-1].name}
+    return rows, next_cursor
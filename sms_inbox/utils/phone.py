@@ -0,0 +1,37 @@
+"""
+Phone number normalization
+"""
+
+import re
+
+from sms_inbox.utils.settings import get_settings
+
+NON_DIGITS = re.compile(r"\D")
+
+
+def normalize_phone_number(phone_number, default_country_code="+61"):
+    if not phone_number:
+        return ""
+    clean = phone_number.replace(" ", "").replace("-", "").replace("(", "").replace(")", "")
+    if clean.startswith("0"):
+        clean = default_country_code + clean[1:]
+    if not clean.startswith("+"):
+        clean = default_country_code + clean
+    return clean
+
+
+def get_default_country_code(fallback="+61"):
+    try:
+        settings = get_settings()
+        return (settings.default_country_code or fallback).strip() or fallback
+    except Exception:
+        return fallback
+
+
+def get_phone_key(phone_number, default_country_code=None):
+    """Canonical E.164 form used to group, index and look up numbers"""
+    if not phone_number:
+        return ""
+    normalized = normalize_phone_number(phone_number, default_country_code or get_default_country_code())
+    digits = NON_DIGITS.sub("", normalized)
+    return f"+{digits}" if digits else ""
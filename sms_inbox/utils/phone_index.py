@@ -0,0 +1,183 @@
+"""
+Phone number to record index for linking inbound SMS
+
+Each source keeps a redis hash of phone_key -> [doctype, name, display
+name]. A lookup reads every source in one round trip and takes the first
+hit in SOURCES order: the record the conversation was last linked to,
+then Contact (all phone rows), Lead and Customer.
+"""
+
+import json
+
+import frappe
+
+from sms_inbox.utils.phone import get_default_country_code, get_phone_key
+
+SOURCES = ("SMS Log", "Contact", "Lead", "Customer")
+INDEX_KEY = "sms_inbox:phone_index:{}"
+DOCS_KEY = "sms_inbox:phone_index_docs"
+BUILT_KEY = "sms_inbox:phone_index_built"
+REBUILD_LOCK_KEY = "sms_inbox:phone_index_rebuild"
+WRITE_CHUNK_SIZE = 1000
+
+# HDEL the given phone keys, but only where the entry still points at document ARGV[1]/ARGV[2]
+REMOVE_OWN_ENTRIES_SCRIPT = """
+for i = 3, #ARGV do
+    local value = redis.call('HGET', KEYS[1], ARGV[i])
+    if value then
+        local entry = cjson.decode(value)
+        if entry[1] == ARGV[1] and entry[2] == ARGV[2] then
+            redis.call('HDEL', KEYS[1], ARGV[i])
+        end
+    end
+end
+return 0
+"""
+
+
+def lookup_phone(phone_key):
+    """Return (linked_doctype, linked_name, display_name), or None while the index isn't built
+
+    A missing index is rebuilt in the background; callers fall back to the database meanwhile.
+    """
+    cache = frappe.cache()
+    if not cache.get(cache.make_key(BUILT_KEY)):
+        frappe.enqueue(
+            "sms_inbox.utils.phone_index.rebuild_phone_index",
+            queue="long",
+            job_id="sms_inbox_phone_index_rebuild",
+            deduplicate=True
+        )
+        return None
+    pipe = cache.pipeline()
+    for source in SOURCES:
+        pipe.hget(cache.make_key(INDEX_KEY.format(source)), phone_key)
+    for value in pipe.execute():
+        if value:
+            return tuple(json.loads(value))
+    return (None, None, None)
+
+
+def set_sms_link(phone_key, linked_doctype, linked_name, contact_name=None):
+    """Record the latest record a conversation was linked to"""
+    if not phone_key or not linked_doctype:
+        return
+    cache = frappe.cache()
+    value = json.dumps([linked_doctype, linked_name, contact_name])
+    frappe.db.after_commit.add(lambda: cache.pipeline().hset(cache.make_key(INDEX_KEY.format("SMS Log")), phone_key, value).execute())
+
+
+def update_phone_index(doc, method=None):
+    """doc_events handler for Contact, Lead and Customer; redis is updated once the save commits"""
+    entries = None if method == "on_trash" else dict(_doc_entries(doc, get_default_country_code()))
+    frappe.db.after_commit.add(lambda: _write_doc_entries(doc.doctype, doc.name, entries))
+
+
+def _write_doc_entries(doctype, name, entries):
+    cache = frappe.cache()
+    doc_key = f"{doctype}::{name}"
+    index_key = cache.make_key(INDEX_KEY.format(doctype))
+    docs_key = cache.make_key(DOCS_KEY)
+
+    # Another record sharing a number may own its entry now; leave those alone
+    previous = json.loads(cache.pipeline().hget(docs_key, doc_key).execute()[0] or "[]")
+    if previous:
+        cache.eval(REMOVE_OWN_ENTRIES_SCRIPT, 1, index_key, doctype, name, *previous)
+
+    pipe = cache.pipeline()
+    if entries is None:
+        pipe.hdel(docs_key, doc_key)
+    else:
+        for phone_key, value in entries.items():
+            pipe.hset(index_key, phone_key, json.dumps(value))
+        pipe.hset(docs_key, doc_key, json.dumps(list(entries)))
+    pipe.execute()
+
+
+def rebuild_phone_index():
+    """Rebuild every source from the database and swap the new hashes in atomically"""
+    cache = frappe.cache()
+    if not cache.set(cache.make_key(REBUILD_LOCK_KEY), 1, ex=600, nx=True):
+        return False
+    try:
+        default_country_code = get_default_country_code()
+        docs = {}
+        pipe = cache.pipeline()
+        for source in SOURCES:
+            entries = {}
+            for doctype, name, display_name, phone in _source_rows(source):
+                phone_key = phone if source == "SMS Log" else get_phone_key(phone, default_country_code)
+                if phone_key:
+                    entries[phone_key] = json.dumps([doctype, name, display_name])
+                    if source != "SMS Log":
+                        docs.setdefault(f"{doctype}::{name}", []).append(phone_key)
+            _replace_hash(pipe, cache.make_key(INDEX_KEY.format(source)), entries)
+        _replace_hash(pipe, cache.make_key(DOCS_KEY), {k: json.dumps(v) for k, v in docs.items()})
+        pipe.set(cache.make_key(BUILT_KEY), 1)
+        pipe.execute()
+        return True
+    finally:
+        cache.delete(cache.make_key(REBUILD_LOCK_KEY))
+
+
+def _replace_hash(pipe, key, entries):
+    tmp_key = f"{key}:rebuilding"
+    pipe.delete(tmp_key)
+    items = list(entries.items())
+    for i in range(0, len(items), WRITE_CHUNK_SIZE):
+        pipe.hset(tmp_key, mapping=dict(items[i:i + WRITE_CHUNK_SIZE]))
+    if items:
+        pipe.rename(tmp_key, key)
+    else:
+        pipe.delete(key)
+
+
+def _doc_entries(doc, default_country_code):
+    if doc.doctype == "Contact":
+        display_name = doc.full_name or f"{doc.first_name or ''} {doc.last_name or ''}".strip()
+        phones = [row.phone for row in doc.get("phone_nos") or []] + [doc.get("mobile_no"), doc.get("phone")]
+    elif doc.doctype == "Lead":
+        display_name = doc.lead_name or doc.company_name
+        phones = [doc.get("mobile_no"), doc.get("phone"), doc.get("whatsapp_no")]
+    else:
+        display_name = doc.customer_name
+        phones = [doc.get("mobile_no")]
+    for phone in phones:
+        phone_key = get_phone_key(phone, default_country_code)
+        if phone_key:
+            yield phone_key, [doc.doctype, doc.name, display_name]
+
+
+def _source_rows(source):
+    if not frappe.db.table_exists(source):
+        return []
+    if source == "SMS Log":
+        return frappe.db.sql("""
+            SELECT linked_doctype, linked_name, contact_name, phone_key FROM (
+                SELECT linked_doctype, linked_name, contact_name, phone_key,
+                    ROW_NUMBER() OVER (PARTITION BY phone_key ORDER BY sent_at DESC, name DESC) AS rn
+                FROM `tabSMS Log`
+                WHERE linked_doctype IS NOT NULL AND linked_doctype != '' AND phone_key IS NOT NULL AND phone_key != ''
+            ) l WHERE rn = 1
+        """)
+    if source == "Contact":
+        return frappe.db.sql("""
+            SELECT 'Contact', c.name, COALESCE(NULLIF(c.full_name, ''), TRIM(CONCAT(IFNULL(c.first_name, ''), ' ', IFNULL(c.last_name, '')))), p.phone
+            FROM `tabContact Phone` p
+            JOIN `tabContact` c ON c.name = p.parent
+            WHERE p.parenttype = 'Contact' AND IFNULL(p.phone, '') != ''
+            UNION ALL
+            SELECT 'Contact', name, COALESCE(NULLIF(full_name, ''), TRIM(CONCAT(IFNULL(first_name, ''), ' ', IFNULL(last_name, '')))), mobile_no
+            FROM `tabContact` WHERE IFNULL(mobile_no, '') != ''
+        """)
+    if source == "Lead":
+        return frappe.db.sql("""
+            SELECT 'Lead', name, COALESCE(NULLIF(lead_name, ''), company_name), mobile_no FROM `tabLead` WHERE IFNULL(mobile_no, '') != ''
+            UNION ALL
+            SELECT 'Lead', name, COALESCE(NULLIF(lead_name, ''), company_name), phone FROM `tabLead` WHERE IFNULL(phone, '') != ''
+            UNION ALL
+            SELECT 'Lead', name, COALESCE(NULLIF(lead_name, ''), company_name), whatsapp_no FROM `tabLead` WHERE IFNULL(whatsapp_no, '') != ''
+        """)
+    return frappe.db.sql("""
+        SELECT 'Customer', name, customer_name, mobile_no FROM `tabCustomer` WHERE IFNULL(mobile_no, '') != ''
+    """)
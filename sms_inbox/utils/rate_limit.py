@@ -0,0 +1,42 @@
+"""
+Token buckets shared by every worker through redis
+"""
+
+import time
+
+import frappe
+
+# Reserves one token and returns the seconds to wait before it may be used.
+# Tokens may go negative, so concurrent callers queue up behind each other.
+TAKE_TOKEN_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or burst
+local ts = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate) - 1
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(burst / rate) + 60)
+if tokens < 0 then
+    return tostring(-tokens / rate)
+end
+return '0'
+"""
+
+
+def reserve_token(bucket, rate, burst=None):
+    rate = float(rate or 0)
+    if rate <= 0:
+        return 0.0
+    burst = max(float(burst or rate), 1.0)
+    cache = frappe.cache()
+    wait = cache.eval(TAKE_TOKEN_SCRIPT, 1, cache.make_key(f"sms_inbox:rate:{bucket}"), rate, burst, time.time())
+    return float(wait)
+
+
+def throttle(bucket, rate, burst=None):
+    """Block until `bucket` has budget for one more message"""
+    wait = reserve_token(bucket, rate, burst)
+    if wait > 0:
+        time.sleep(wait)
@@ -0,0 +1,55 @@
+"""
+Realtime fan-out for inbox events
+
+Events go to the "SMS Conversation" doctype room, which the desk joins
+via doctype_subscribe. Frappe checks read permission on that doctype when
+a socket subscribes, so one publish reaches every inbox user and nobody
+else. Events raised within COALESCE_WINDOW are merged into one payload.
+"""
+
+import json
+import time
+
+import frappe
+from frappe.realtime import get_doctype_room
+
+from sms_inbox.utils.metrics import count
+
+INBOX_DOCTYPE = "SMS Conversation"
+COALESCE_WINDOW = 1.0
+FLUSH_FLAG_TTL = 60
+
+
+def publish_realtime(event, message, **kwargs):
+    """frappe.publish_realtime plus the per-event publish counter"""
+    count("sms_inbox_realtime_published_total", event=event)
+    frappe.publish_realtime(event=event, message=message, **kwargs)
+
+
+def publish_inbox_event(event, message):
+    """Queue an event; the first one in a window schedules the flush"""
+    cache = frappe.cache()
+    cache.rpush(f"sms_inbox:realtime:{event}", json.dumps(message, default=str))
+    if cache.set(cache.make_key(f"sms_inbox:realtime_flush:{event}"), 1, ex=FLUSH_FLAG_TTL, nx=True):
+        frappe.enqueue("sms_inbox.utils.realtime.flush_inbox_events", queue="short", event=event, enqueue_after_commit=True)
+
+
+def flush_inbox_events(event):
+    from sms_inbox.sms_inbox.doctype.sms_conversation.sms_conversation import get_inbound_total
+
+    time.sleep(COALESCE_WINDOW)
+    cache = frappe.cache()
+    cache.delete(cache.make_key(f"sms_inbox:realtime_flush:{event}"))
+    key = cache.make_key(f"sms_inbox:realtime:{event}")
+    pipe = cache.pipeline()
+    pipe.lrange(key, 0, -1)
+    pipe.delete(key)
+    items = [json.loads(item) for item in pipe.execute()[0]]
+    if not items:
+        return
+
+    # Unread counts are per user; clients subtract their own read total from inbound_total
+    message = dict(items[-1], inbound_total=get_inbound_total())
+    if event == "new_sms":
+        message["events"] = items
+    publish_realtime(event, message, room=get_doctype_room(INBOX_DOCTYPE))
@@ -0,0 +1,77 @@
+"""
+Outbound sender number pool
+
+Messages go out from the enabled numbers in SMS Inbox Settings > Sender
+Numbers, each with its own rate bucket. A recipient sticks to the number
+their conversation is assigned (the last one we used or they texted);
+new recipients are spread over the pool by a hash of their number. With
+no pool rows a Messaging Service SID lets Twilio pick the sender, and
+failing that the single Twilio Phone Number is used.
+"""
+
+import zlib
+
+import frappe
+from frappe.utils import flt
+
+from sms_inbox.utils.rate_limit import throttle
+
+
+def get_sender_pool(settings):
+    """Enabled sender numbers -> messages per second"""
+    default_rate = flt(settings.rate_limit_per_second)
+    pool = {
+        row.phone_number.strip(): flt(row.rate_limit_per_second) or default_rate
+        for row in settings.get("sender_numbers") or []
+        if row.enabled and row.phone_number
+    }
+    if not pool and not settings.messaging_service_sid and settings.phone_number:
+        pool[settings.phone_number.strip()] = default_rate
+    return pool
+
+
+def assign_senders(phone_keys, settings):
+    """phone_key -> sender number, empty when sending through the Messaging Service"""
+    pool = sorted(get_sender_pool(settings))
+    phone_keys = tuple(set(filter(None, phone_keys)))
+    if not pool or not phone_keys:
+        return {}
+    current = dict(frappe.db.sql("SELECT name, sender_number FROM `tabSMS Conversation` WHERE name IN %s", (phone_keys,)))
+    return {
+        key: current.get(key) if current.get(key) in pool else pool[zlib.crc32(key.encode()) % len(pool)]
+        for key in phone_keys
+    }
+
+
+def get_sender(phone_key, settings, preferred=None):
+    """Sender for one recipient; preferred (e.g. the number a queued row was assigned) wins while it is still in the pool"""
+    if preferred and preferred in get_sender_pool(settings):
+        return preferred
+    return assign_senders([phone_key], settings).get(phone_key)
+
+
+def save_sender_assignments(assignments):
+    """Persist sticky senders on conversations, one UPDATE per number"""
+    by_sender = {}
+    for phone_key, sender in assignments.items():
+        by_sender.setdefault(sender, []).append(phone_key)
+    for sender, phone_keys in by_sender.items():
+        frappe.db.sql("""
+            UPDATE `tabSMS Conversation` SET sender_number = %s
+            WHERE name IN %s AND IFNULL(sender_number, '') != %s
+        """, (sender, tuple(phone_keys), sender))
+
+
+def sender_params(sender, settings):
+    """Sender arguments for client.messages.create"""
+    if sender:
+        return {"from_": sender}
+    return {"messaging_service_sid": settings.messaging_service_sid}
+
+
+def throttle_sender(sender, settings):
+    """Block until the sender's own bucket (the Messaging Service's without one) has budget"""
+    if sender:
+        throttle(sender, get_sender_pool(settings).get(sender) or settings.rate_limit_per_second)
+    else:
+        throttle(settings.messaging_service_sid, settings.rate_limit_per_second)
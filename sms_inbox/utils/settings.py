@@ -0,0 +1,35 @@
+"""
+Cached SMS Inbox Settings snapshot
+"""
+
+import frappe
+from frappe.model import no_value_fields, table_fields
+
+SETTINGS_KEY = "sms_inbox:settings"
+
+
+def get_settings():
+    """Plain dict of SMS Inbox Settings, cached per site in redis and for the rest of the request
+
+    Password fields are left out; use get_decrypted_password where the secret is needed.
+    Child tables are kept as lists of plain dicts.
+    """
+    return frappe.cache().get_value(SETTINGS_KEY, generator=_load_settings)
+
+
+def clear_settings_cache():
+    frappe.cache().delete_value(SETTINGS_KEY)
+
+
+def _load_settings():
+    doc = frappe.get_single("SMS Inbox Settings")
+    settings = frappe._dict({
+        df.fieldname: doc.get(df.fieldname)
+        for df in doc.meta.fields
+        if df.fieldtype not in no_value_fields and df.fieldtype != "Password"
+    })
+    for df in doc.meta.fields:
+        if df.fieldtype in table_fields:
+            settings[df.fieldname] = [frappe._dict(row.as_dict(no_default_fields=True)) for row in doc.get(df.fieldname)]
+    settings.modified = str(doc.modified)
+    return settings
@@ -0,0 +1,74 @@
+"""
+Twilio REST client factory
+
+Clients are kept per site for the life of the worker process, so
+steady-state sends reuse the HTTP session's keep-alive connections
+instead of decrypting the token and doing a TLS handshake every time.
+A client is rebuilt when SMS Inbox Settings are saved.
+"""
+
+import json
+import time
+from functools import lru_cache
+
+import frappe
+from frappe.utils.password import get_decrypted_password
+
+from sms_inbox.utils.metrics import record_twilio_request
+from sms_inbox.utils.settings import get_settings
+
+# site -> (fingerprint, client)
+_clients = {}
+
+
+def get_twilio_client(settings=None):
+    settings = settings or get_settings()
+    # site_config `sms_inbox_twilio_base_url` points the Messages API elsewhere, e.g. the benchmark stand-in
+    base_url = frappe.conf.get("sms_inbox_twilio_base_url")
+    fingerprint = (settings.account_sid, settings.modified, base_url)
+    cached = _clients.get(frappe.local.site)
+    if cached and cached[0] == fingerprint:
+        return cached[1]
+
+    client = _build_client(settings, base_url)
+    _clients[frappe.local.site] = (fingerprint, client)
+    return client
+
+
+def _build_client(settings, base_url):
+    from twilio.rest import Client
+
+    auth_token = get_decrypted_password("SMS Inbox Settings", "SMS Inbox Settings", "auth_token", raise_exception=False)
+    client = Client(settings.account_sid, auth_token, http_client=_instrumented_http_client_class()(pool_connections=True))
+    if base_url:
+        client.api.base_url = base_url.rstrip("/")
+    return client
+
+
+@lru_cache(maxsize=None)
+def _instrumented_http_client_class():
+    from twilio.http.http_client import TwilioHttpClient
+
+    class InstrumentedHttpClient(TwilioHttpClient):
+        """Times every Twilio request and counts responses by status and Twilio error code"""
+
+        def request(self, method, url, *args, **kwargs):
+            started = time.perf_counter()
+            try:
+                response = super().request(method, url, *args, **kwargs)
+            except Exception:
+                record_twilio_request(method, time.perf_counter() - started, "network_error")
+                raise
+            record_twilio_request(method, time.perf_counter() - started, response.status_code, _error_code(response))
+            return response
+
+    return InstrumentedHttpClient
+
+
+def _error_code(response):
+    if response.status_code < 400:
+        return None
+    try:
+        return json.loads(response.text).get("code")
+    except Exception:
+        return None